@@ -0,0 +1,145 @@
+"""Per-row vs. bulk ingest against a dev/local MySQL (DATABASE_URL / DATABASE_PASSWORD).
+
+`--dataset trade_doc_meta` writes `--rows` document meta records, once with one SP call and commit per row, once
+through `bulk_create_trade_documents_meta`. Each run tags its rows with a unique `notes` marker; after each phase the
+rows carrying it are looked up and deleted by the td_id the database holds for them, so other rows are never touched.
+
+`--dataset transactions` posts `--rows` transactions against `--trade-id` through `create_transaction`, from
+`--threads` concurrent callers like single posts from many clients, then through `bulk_create_transactions` in
+requests of `--batch-rows`, then replays the bulk requests with the same idempotency keys (a client retrying after a
+timeout). There is no SP to delete transactions: every row carries the run marker as `trans_description` and its
+idempotency key starts with it, remove them by hand on shared databases.
+
+    python -m benchmarks.bench_bulk_ingest --rows 500 --start-td-id 900000 --issuer-id 1 --investor-type 1
+    python -m benchmarks.bench_bulk_ingest --dataset transactions --rows 20000 --trade-id 1 --threads 16
+"""
+import argparse
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+from dbutil_package.db_trades import AppRulesDataRetriever
+
+
+def make_rows(args, marker: str):
+    return [{
+        "td_id": args.start_td_id + index,
+        "issuer_id": args.issuer_id,
+        "investor_type": args.investor_type,
+        "document_type_id": args.document_type_id,
+        "optional": 0,
+        "email_address": "bench@example.com",
+        "notes": marker,
+        "created_by": "bench",
+    } for index in range(args.rows)]
+
+
+def make_transactions(args, marker: str, phase: str):
+    return [{
+        "idempotency_key": f"{marker}:{phase}:{index}",
+        "trans_acc_no": args.trans_acc_no,
+        "trade_id": args.trade_id,
+        "posting_date": date.today(),
+        "trans_description": marker,
+        "withdrawal_deposit": str(index % 2),
+        "trans_type_id": args.trans_type_id,
+        "amount": index % 1000 + 1,
+        "created_by": "bench",
+    } for index in range(args.rows)]
+
+
+def cleanup(retriever, marker: str) -> int:
+    # read past the cache, on the primary within the read-your-writes window of the writes above
+    result = retriever._call_sp("sp_trade_documents_meta_list", rec_type_key="TRADE_DOCUMENTS_META", shape="rows")
+    if result.get("status") != "success":
+        raise SystemExit(f"Could not list trade document meta to clean up {marker!r}: {result.get('message')}")
+    table = (result.get("data") or {}).get("TRADE_DOCUMENTS_META") or {"columns": [], "rows": []}
+    if not table["rows"]:
+        return 0
+    columns = table["columns"]
+    if not {"td_id", "notes"} <= set(columns):
+        raise SystemExit(f"sp_trade_documents_meta_list returns no td_id/notes, delete rows noted {marker!r} by hand")
+    td_id, notes = columns.index("td_id"), columns.index("notes")
+    td_ids = [row[td_id] for row in table["rows"] if row[notes] == marker]
+    if td_ids:
+        retriever.execute_sp_batch("sp_trade_documents_meta_delete", [[value, "bench"] for value in td_ids],
+                                   atomic=False)
+    return len(td_ids)
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    results = fn(*args)
+    return time.perf_counter() - start, results
+
+
+def bench_trade_doc_meta(args, retriever, marker: str) -> list:
+    rows = make_rows(args, marker)
+
+    per_row_s, per_row = timed(lambda: [retriever.create_trade_documents_meta(row) for row in rows])
+    cleanup(retriever, marker)
+
+    bulk_s, bulk = timed(retriever.bulk_create_trade_documents_meta, rows)
+    cleanup(retriever, marker)
+    return [("per_row", per_row_s, per_row), ("bulk", bulk_s, bulk)]
+
+
+def bench_transactions(args, retriever, marker: str) -> list:
+    # validated once up front like the routes do, not per row
+    if args.trans_type_id not in retriever.transaction_type_ids():
+        raise SystemExit(f"Unknown trans_type_id {args.trans_type_id}")
+
+    singles = make_transactions(args, marker, "single")
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        per_row_s, per_row = timed(lambda: list(pool.map(retriever.create_transaction, singles)))
+
+    batches = make_transactions(args, marker, "bulk")
+    requests = [batches[start:start + args.batch_rows] for start in range(0, len(batches), args.batch_rows)]
+
+    def post_all():
+        return [result for request in requests for result in retriever.bulk_create_transactions(request)]
+
+    bulk_s, bulk = timed(post_all)
+    replay_s, replay = timed(post_all)
+    return [(f"per_row x{args.threads}", per_row_s, per_row), (f"bulk x{args.batch_rows}", bulk_s, bulk),
+            ("bulk replay", replay_s, replay)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dataset", choices=("trade_doc_meta", "transactions"), default="trade_doc_meta")
+    parser.add_argument("--rows", type=int, default=500)
+    parser.add_argument("--start-td-id", type=int, default=900000)
+    parser.add_argument("--issuer-id", type=int, default=1)
+    parser.add_argument("--investor-type", type=int, default=1)
+    parser.add_argument("--document-type-id", type=int, default=1)
+    parser.add_argument("--trade-id", type=int, default=1)
+    parser.add_argument("--trans-acc-no", type=int, default=1)
+    parser.add_argument("--trans-type-id", type=int, default=1)
+    parser.add_argument("--threads", type=int, default=16, help="concurrent callers posting single transactions")
+    parser.add_argument("--batch-rows", type=int, default=1000, help="transactions per bulk request")
+    args = parser.parse_args()
+
+    retriever = AppRulesDataRetriever()
+    marker = f"bench_bulk_ingest {uuid.uuid4().hex}"
+    if args.dataset == "transactions":
+        phases = bench_transactions(args, retriever, marker)
+        print({"marker": marker})
+    else:
+        phases = bench_trade_doc_meta(args, retriever, marker)
+
+    for mode, elapsed, results in phases:
+        print({
+            "dataset": args.dataset,
+            "mode": mode,
+            "rows": args.rows,
+            "elapsed_s": round(elapsed, 3),
+            "rows_per_s": round(args.rows / elapsed, 1),
+            "failed": sum(1 for result in results if result.get("status") != "success"),
+            "replayed": sum(1 for result in results if result.get("replayed")),
+        })
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Event loop benchmark: mixed slow/fast endpoints, blocking calls vs. DBExecutor dispatch.
+
+Emulates a slow `sp_trade_list_all` and fast lookup SPs with `time.sleep` (blocking, like
+mysql-connector I/O) and reports throughput and fast-call latency for both modes.
+
+    python -m benchmarks.bench_event_loop --requests 400 --slow-ratio 0.1 --rate 200 --workers 16
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+from dbutil_package.db_executor import DBExecutor
+
+
+def slow_sp():
+    time.sleep(0.25)
+
+
+def fast_sp():
+    time.sleep(0.005)
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+async def run_mode(mode: str, total: int, slow_ratio: float, rate: float, executor: DBExecutor = None):
+    """Open-loop load: requests arrive at `rate` per second, latency is measured from scheduled arrival."""
+    random.seed(42)
+    calls = [slow_sp if random.random() < slow_ratio else fast_sp for _ in range(total)]
+    fast_latencies = []
+
+    async def handle(call, arrival):
+        await asyncio.sleep(max(0.0, arrival - time.perf_counter()))
+        if mode == "blocking":
+            call()
+        else:
+            await executor.run(call)
+        if call is fast_sp:
+            fast_latencies.append(time.perf_counter() - arrival)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(handle(call, start + i / rate) for i, call in enumerate(calls)))
+    elapsed = time.perf_counter() - start
+
+    return {
+        "mode": mode,
+        "requests": total,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(total / elapsed, 1),
+        "fast_p50_ms": round(statistics.median(fast_latencies) * 1000, 2),
+        "fast_p99_ms": round(percentile(fast_latencies, 99) * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--slow-ratio", type=float, default=0.1)
+    parser.add_argument("--rate", type=float, default=200.0, help="arrival rate, requests/second")
+    parser.add_argument("--workers", type=int, default=16)
+    args = parser.parse_args()
+
+    print(asyncio.run(run_mode("blocking", args.requests, args.slow_ratio, args.rate)))
+
+    executor = DBExecutor(max_workers=args.workers)
+    try:
+        print(asyncio.run(run_mode("executor", args.requests, args.slow_ratio, args.rate, executor)))
+    finally:
+        executor.shutdown()
+
+
+if __name__ == "__main__":
+    main()
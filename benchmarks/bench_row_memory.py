@@ -0,0 +1,90 @@
+"""Memory benchmark for large SP results: a dict per row (before) vs. a RowSet over the cursor's row tuples (after).
+
+Each case runs in a fresh process so its peak RSS is its own. It builds the rows a cursor's fetchall() returns, wraps
+them in the retriever envelope either way (like `AppRulesDataRetriever._sp_response`), serializes it with fast_json
+like a response, and reports RSS once the result is built (what a worker holds while the result is alive), the peak
+before serialization and the peak including it. Needs only the serialization dependencies, not the database driver.
+
+    python -m benchmarks.bench_row_memory --rows 100000 1000000
+"""
+import argparse
+import gc
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+COLUMNS = ["trade_id", "trans_acc_no", "issuer_id", "trans_type_id", "investor_type", "posting_date", "amount",
+           "withdrawal_deposit", "created_at", "created_by"]
+
+
+def fetched_rows(rows: int) -> list:
+    # distinct value objects per row, as the MySQL connector returns them
+    start = datetime(2020, 1, 1, 9, 30)
+    return [(index, 100000 + index % 20000, index % 40 + 1, index % 12 + 1, index % 8 + 1,
+             (start + timedelta(minutes=index)).date(), Decimal(index % 1000000) / 100, str(index % 2),
+             start + timedelta(seconds=index), "Admin") for index in range(rows)]
+
+
+def rss_mb() -> float:
+    with open("/proc/self/statm") as statm:
+        return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+
+
+def peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_case(rows: int, representation: str) -> dict:
+    from dbutil_package.db_rows import RowSet
+    from dbutil_package.fast_json import dumps, orjson
+
+    baseline = rss_mb()
+    fetched = fetched_rows(rows)
+    fetched_mb = rss_mb() - baseline
+
+    start = time.perf_counter()
+    if representation == "rowset":
+        records = RowSet(COLUMNS, fetched)
+    else:
+        records = [dict(zip(COLUMNS, row)) for row in fetched]
+    result = {"status": "success", "data": {"TRADE_LIST": records}}
+    build_ms = (time.perf_counter() - start) * 1000
+    del fetched, records
+    gc.collect()
+    held_mb = rss_mb() - baseline
+    peak_before_mb = peak_rss_mb() - baseline
+
+    start = time.perf_counter()
+    payload = dumps(result)
+    serialize_ms = (time.perf_counter() - start) * 1000
+    return {"rows": rows, "representation": representation, "encoder": "orjson" if orjson else "json",
+            "fetched_rows_mb": round(fetched_mb, 1), "result_held_mb": round(held_mb, 1),
+            "peak_before_serialize_mb": round(peak_before_mb, 1), "peak_rss_mb": round(peak_rss_mb() - baseline, 1),
+            "build_ms": round(build_ms, 1), "serialize_ms": round(serialize_ms, 1),
+            "payload_mb": round(len(payload) / 2 ** 20, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[100000, 1000000])
+    parser.add_argument("--case", nargs=2, metavar=("ROWS", "REPRESENTATION"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        print(json.dumps(run_case(int(args.case[0]), args.case[1])))
+        return
+
+    for rows in args.rows:
+        for representation in ("dicts", "rowset"):
+            output = subprocess.run([sys.executable, "-m", "benchmarks.bench_row_memory", "--case", str(rows),
+                                     representation], check=True, capture_output=True, text=True).stdout
+            print(json.loads(output.strip().splitlines()[-1]))
+
+
+if __name__ == "__main__":
+    main()
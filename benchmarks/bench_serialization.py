@@ -0,0 +1,77 @@
+"""Serialization micro-benchmark for large SP results: stdlib json (+ jsonable_encoder when FastAPI is installed)
+vs. the orjson path used by FastJSONResponse. Reports time and peak traced allocations per payload size.
+
+    python -m benchmarks.bench_serialization --rows 10000 100000
+"""
+import argparse
+import json
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from dbutil_package.fast_json import dumps
+
+try:
+    from fastapi.encoders import jsonable_encoder
+except ImportError:
+    jsonable_encoder = None
+
+
+def make_result(rows: int) -> dict:
+    start = datetime(2024, 1, 1, 9, 30)
+    return {"status": "success", "data": {"TRADE_LIST": [{
+        "trade_id": index,
+        "trans_acc_no": 100000 + index % 5000,
+        "issuer_id": index % 40,
+        "trans_type_id": index % 12,
+        "posting_date": (start + timedelta(minutes=index)).date(),
+        "created_at": start + timedelta(seconds=index),
+        "amount": Decimal(index % 100000) / 100,
+        "units": Decimal("1250.5000"),
+        "trans_description": f"Subscription {index}",
+        "created_by": "Admin",
+    } for index in range(rows)]}}
+
+
+def stdlib_json(result) -> bytes:
+    return json.dumps(result, default=str).encode("utf-8")
+
+
+def fastapi_default(result) -> bytes:
+    return json.dumps(jsonable_encoder(result), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def measure(name: str, fn, result, repeat: int = 3) -> dict:
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        payload = fn(result)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    tracemalloc.start()
+    fn(result)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"encoder": name, "best_ms": round(best * 1000, 1), "peak_alloc_mb": round(peak / 2 ** 20, 1),
+            "payload_mb": round(len(payload) / 2 ** 20, 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 100000])
+    args = parser.parse_args()
+
+    encoders = [("stdlib_json", stdlib_json), ("fast_json", dumps)]
+    if jsonable_encoder is not None:
+        encoders.insert(0, ("jsonable_encoder+json", fastapi_default))
+
+    for rows in args.rows:
+        result = make_result(rows)
+        for name, fn in encoders:
+            print(dict(rows=rows, **measure(name, fn, result)))
+
+
+if __name__ == "__main__":
+    main()
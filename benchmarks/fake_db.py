@@ -0,0 +1,156 @@
+"""In-memory stand-in for the stax_bo stored procedures, used by the load test instead of MySQL.
+
+`FakeStoredProcedures` seeds realistic volumes and answers each SP with the same (columns, row tuples) shape
+`AppRulesDataRetriever.execute_sp` returns, sleeping for a latency model of `base_ms + rows * per_row_us` to
+emulate DB time. `install()` patches the retriever class so the FastAPI app runs unchanged on top of it.
+"""
+import random
+import threading
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+
+class FakeStoredProcedures:
+    def __init__(self, trades: int = 1000000, doc_meta: int = 100000, applications: int = 5000,
+                 base_ms: float = 2.0, per_row_us: float = 0.5, seed: int = 7):
+        rng = random.Random(seed)
+        self.base_ms = base_ms
+        self.per_row_us = per_row_us
+        self.applications = applications
+        self._lock = threading.Lock()
+        self.calls = {}
+
+        self.transaction_types = (["trans_type_id", "name", "description"],
+                                  [(index, f"TYPE_{index}", f"Transaction type {index}") for index in range(1, 13)])
+        self.issuers = (["issuer_id", "name", "status"],
+                        [(index, f"Issuer {index}", "ACTIVE") for index in range(1, 41)])
+        self.investor_types = (["investor_id", "name", "description"],
+                               [(index, f"Investor {index}", f"Investor type {index}") for index in range(1, 9)])
+        self.doc_types = (["document_type_id", "name", "description"],
+                          [(index, f"DOC_{index}", f"Document type {index}") for index in range(1, 61)])
+        self.forms = (["form_id", "name", "version"], [(index, f"Form {index}", "1.0") for index in range(1, 31)])
+
+        # Shared value objects keep a 1M row table at a realistic, not inflated, memory cost
+        days = [date(2020, 1, 1) + timedelta(days=day) for day in range(1500)]
+        stamps = [datetime(2020, 1, 1) + timedelta(minutes=minute) for minute in range(0, 1500 * 24 * 60, 97)]
+        amounts = [Decimal(cents) / 100 for cents in range(100, 10000000, 9973)]
+        self.trade_columns = ["trade_id", "trans_acc_no", "issuer_id", "trans_type_id", "investor_type",
+                              "posting_date", "amount", "withdrawal_deposit", "created_at", "created_by"]
+        self.trades = [(index, 100000 + rng.randrange(20000), rng.randrange(1, 41), rng.randrange(1, 13),
+                        rng.randrange(1, 9), days[rng.randrange(len(days))], amounts[rng.randrange(len(amounts))],
+                        "1" if rng.random() < 0.7 else "0", stamps[rng.randrange(len(stamps))], "Admin")
+                       for index in range(1, trades + 1)]
+
+        self.doc_meta = (["td_id", "issuer_id", "investor_type", "document_type_id", "optional", "email_address",
+                          "notes", "created_by"],
+                         [(index, rng.randrange(1, 41), rng.randrange(1, 9), rng.randrange(1, 61),
+                           rng.randrange(2), "ops@example.com", "", "Admin") for index in range(1, doc_meta + 1)])
+
+    def _sleep(self, rows: int):
+        time.sleep((self.base_ms + rows * self.per_row_us / 1000) / 1000)
+
+    def _app_rows(self, app_id: int, count: int, columns: list, make):
+        if not 1 <= int(app_id) <= self.applications:
+            return columns, []
+        return columns, [make(app_id, index) for index in range(count)]
+
+    def _trade_page(self, after_id, limit, trade_id, date_from, date_to, issuer_id, trans_type_id):
+        if trade_id is not None:
+            rows = [self.trades[trade_id - 1]] if 1 <= trade_id <= len(self.trades) else []
+            return self.trade_columns, rows
+
+        start = after_id or 0
+        rows = []
+        for row in self.trades[start:]:
+            if issuer_id is not None and row[2] != issuer_id:
+                continue
+            if trans_type_id is not None and row[3] != trans_type_id:
+                continue
+            if date_from is not None and row[5] < date_from:
+                continue
+            if date_to is not None and row[5] > date_to:
+                continue
+            rows.append(row)
+            if len(rows) >= limit:
+                break
+        return self.trade_columns, rows
+
+    def call(self, sp: str, params=None):
+        params = list(params or [])
+        with self._lock:
+            self.calls[sp] = self.calls.get(sp, 0) + 1
+
+        if sp == "sp_trade_list_all":
+            result = (self.trade_columns, self.trades)
+        elif sp == "sp_trade_list_page":
+            result = self._trade_page(*params)
+        elif sp == "sp_trade_documents_meta_list":
+            result = self.doc_meta
+        elif sp == "sp_get_all_transaction_types":
+            result = self.transaction_types
+        elif sp == "sp_trade_issuers_list":
+            result = self.issuers
+        elif sp == "sp_investor_type_list":
+            result = self.investor_types
+        elif sp == "sp_stxstage_forms_lookup":
+            result = self.forms
+        elif sp == "sp_lookup_doctypes_id":
+            result = (self.doc_types[0], [row for row in self.doc_types[1] if row[0] == params[0]])
+        elif sp == "sp_lookup_doctypes_name":
+            result = (self.doc_types[0], [row for row in self.doc_types[1] if row[1] == params[0]])
+        elif sp == "sp_reg_review_lookup_AppId":
+            result = self._app_rows(params[0], 25, ["id", "applicationId", "ruleId", "override", "status", "notes"],
+                                    lambda app_id, index: (app_id * 100 + index, app_id, index + 1, 0,
+                                                           "PASS" if index % 4 else "FAIL", ""))
+        elif sp == "sp_reg_review_lookup_RuleId":
+            result = self._app_rows(params[0], 1, ["id", "applicationId", "ruleId", "override", "status", "notes"],
+                                    lambda app_id, index: (app_id * 100 + params[1], app_id, params[1], 0, "PASS", ""))
+        elif sp == "sp_stxstage_client_lookup":
+            result = self._app_rows(params[0], 1, ["app_id", "first_name", "last_name", "email", "address", "notes"],
+                                    lambda app_id, index: (app_id, "Jane", "Doe", "jane@example.com",
+                                                           "1 Main St", "x" * 2000))
+        elif sp == "sp_stxstage_sponsor_lookup":
+            result = self._app_rows(params[0], 1, ["app_id", "sponsor_name", "sponsor_id"],
+                                    lambda app_id, index: (app_id, "Sponsor", app_id % 50))
+        elif sp == "sp_stxstage_responses_lookup":
+            result = self._app_rows(params[0], 120, ["app_id", "question_id", "response"],
+                                    lambda app_id, index: (app_id, index, "response text " * 20))
+        elif sp == "sp_stxstage_repJoin_lookup":
+            result = self._app_rows(params[0], 2, ["app_id", "rep_id", "rep_name"],
+                                    lambda app_id, index: (app_id, index, f"Rep {index}"))
+        elif sp == "sp_stxstage_app_docs_uploads":
+            result = self._app_rows(params[0], 8, ["app_id", "doc_id", "file_name", "uploaded_at"],
+                                    lambda app_id, index: (app_id, index, f"doc_{index}.pdf", datetime(2024, 1, 1)))
+        else:
+            # writers: a single message row like the real SPs
+            result = (["message"], [("message",)])
+
+        self._sleep(len(result[1]))
+        return result
+
+    def stream(self, sp: str, params=None, batch_size: int = 1000):
+        columns, rows = self.call(sp, params)
+        return columns, (rows[start:start + batch_size] for start in range(0, len(rows), batch_size))
+
+    def batch(self, sp: str, param_rows: list, atomic: bool = True, chunk_size: int = 200):
+        # one round trip per chunk plus the commit
+        for _ in range(0, len(param_rows), chunk_size):
+            self._sleep(0)
+        self._sleep(0)
+        return [{"status": "success", "message": "message"} for _ in param_rows]
+
+
+def install(fake: FakeStoredProcedures):
+    """Route every AppRulesDataRetriever DB path to `fake` and make DatabaseHandler construction side-effect free."""
+    from dbutil_package.db_pool import ConnectionPool
+    from dbutil_package.db_trades import AppRulesDataRetriever
+    from dbutil_package.dbutil.common import DatabaseHandler
+
+    DatabaseHandler.__init__ = lambda self, *args, **kwargs: None
+    ConnectionPool.fill = lambda self: None
+    AppRulesDataRetriever.execute_sp = lambda self, sp, params=None: fake.call(sp, params)
+    AppRulesDataRetriever.stream_sp = lambda self, sp, params=None, batch_size=1000: fake.stream(sp, params,
+                                                                                                  batch_size)
+    AppRulesDataRetriever.execute_sp_batch = lambda self, sp, param_rows, atomic=True, chunk_size=200: fake.batch(
+        sp, param_rows, atomic, chunk_size)
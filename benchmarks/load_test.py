@@ -0,0 +1,284 @@
+"""Load test for the trades service: drives a weighted mix of endpoints concurrently and reports throughput,
+p50/p95/p99 latency and memory per endpoint, saved as JSON for run-to-run comparison.
+
+By default the FastAPI app is started in-process (ASGI, no sockets) on top of `benchmarks.fake_db`, which emulates
+the stored procedures and their latency with seeded volumes. With `--url` the same mix is sent over HTTP to a running
+service, e.g. one connected to a local MySQL.
+
+    python -m benchmarks.load_test --trades 1000000 --doc-meta 100000 --applications 5000 --duration 20
+    python -m benchmarks.load_test --url http://localhost:8004 --concurrency 64
+    python -m benchmarks.load_test --compare benchmarks/results/previous.json
+"""
+import argparse
+import asyncio
+import http.client
+import json
+import os
+import random
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import urlparse
+
+# (name, path template, weight). {app_id}, {issuer_id} and {investor_type} are replaced by random seeded ids
+ENDPOINTS = [
+    ("list_all_trades_page", "/list_all_trades?limit=500", 10),
+    ("list_trade_docs_meta", "/list_trade_docs_meta", 1),
+    ("list_all_transaction_types", "/list_all_transaction_types", 10),
+    ("list_issuers_list", "/list_issuers_list", 10),
+    ("list_investor_type", "/list_investor_type", 5),
+    ("lookup_forms", "/lookup_forms/", 5),
+    ("required_docs", "/required_docs?issuer_id={issuer_id}&investor_type={investor_type}", 10),
+    ("trade_aggregates", "/trade_aggregates?group_by=posting_date", 5),
+    ("lookup_app_rules", "/lookup_app_rules/{app_id}", 20),
+    ("lookup_client", "/lookup_client/{app_id}", 15),
+    ("lookup_response", "/lookup_response/{app_id}", 10),
+    ("application_bundle", "/application/{app_id}/bundle", 10),
+]
+FULL_TRADES = ("list_all_trades_full", "/list_all_trades", 1)
+
+
+def percentile(values: list, pct: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))] if values else 0.0
+
+
+def rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class RssSampler:
+    """Samples this process' RSS in the background to get the peak over a phase."""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.peak = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, rss_mb())
+            time.sleep(self.interval)
+
+    def __enter__(self):
+        self.start = rss_mb()
+        self.peak = self.start
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+class AsgiClient:
+    """Minimal in-process ASGI GET client, returns (status, body bytes)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def get(self, path_qs: str):
+        path, _, query = path_qs.partition("?")
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+            "path": path, "raw_path": path.encode(), "root_path": "", "query_string": query.encode(),
+            "headers": [(b"host", b"bench"), (b"accept-encoding", b"identity")],
+            "client": ("127.0.0.1", 50000), "server": ("bench", 80),
+        }
+        response = {"status": 0, "bytes": 0}
+
+        async def receive():
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+            elif message["type"] == "http.response.body":
+                response["bytes"] += len(message.get("body", b""))
+
+        await self.app(scope, receive, send)
+        return response["status"], response["bytes"]
+
+
+class HttpClient:
+    """Blocking keep-alive HTTP client per thread, driven from asyncio through a thread pool."""
+
+    def __init__(self, url: str, concurrency: int):
+        parsed = urlparse(url)
+        self.host, self.port = parsed.hostname, parsed.port or 80
+        self._local = threading.local()
+        self._pool = ThreadPoolExecutor(max_workers=concurrency)
+
+    def _get(self, path_qs: str):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = http.client.HTTPConnection(self.host, self.port, timeout=60)
+        conn.request("GET", path_qs)
+        response = conn.getresponse()
+        return response.status, len(response.read())
+
+    async def get(self, path_qs: str):
+        return await asyncio.get_running_loop().run_in_executor(self._pool, self._get, path_qs)
+
+
+async def run_requests(client, plan: list, concurrency: int, applications: int, duration: float,
+                       max_requests: int = None) -> dict:
+    """Closed-loop load: `concurrency` workers pick weighted endpoints until `duration` or `max_requests`."""
+    rng = random.Random(11)
+    names = [name for name, _, _ in plan]
+    paths = {name: path for name, path, _ in plan}
+    weights = [weight for _, _, weight in plan]
+    samples = {name: {"latencies": [], "bytes": 0, "errors": 0} for name in names}
+    deadline = time.perf_counter() + duration
+    issued = 0
+
+    async def worker():
+        nonlocal issued
+        while time.perf_counter() < deadline and (max_requests is None or issued < max_requests):
+            issued += 1
+            name = rng.choices(names, weights)[0]
+            path = paths[name].format(app_id=rng.randint(1, applications), issuer_id=rng.randint(1, 40),
+                                      investor_type=rng.randint(1, 8))
+            start = time.perf_counter()
+            try:
+                status, size = await client.get(path)
+            except Exception:
+                status, size = 0, 0
+            sample = samples[name]
+            sample["latencies"].append(time.perf_counter() - start)
+            sample["bytes"] += size
+            if status != 200:
+                sample["errors"] += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    report = {}
+    for name, sample in samples.items():
+        latencies = sample["latencies"]
+        if not latencies:
+            continue
+        report[name] = {
+            "requests": len(latencies),
+            "errors": sample["errors"],
+            "throughput_rps": round(len(latencies) / elapsed, 1),
+            "p50_ms": round(statistics.median(latencies) * 1000, 2),
+            "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+            "avg_bytes": int(sample["bytes"] / len(latencies)),
+        }
+    total = sum(len(sample["latencies"]) for sample in samples.values())
+    return {"elapsed_s": round(elapsed, 2), "requests": total, "throughput_rps": round(total / elapsed, 1),
+            "endpoints": report}
+
+
+async def run_suite(client, args, plan: list) -> dict:
+    results = {"mixed": None, "isolated": {}}
+
+    # Warm-up fills the reference caches and pools like production traffic would
+    await run_requests(client, plan, min(args.concurrency, 8), args.applications, duration=1.0,
+                       max_requests=len(plan) * 4)
+
+    with RssSampler() as rss:
+        results["mixed"] = await run_requests(client, plan, args.concurrency, args.applications, args.duration)
+    results["mixed"]["rss_start_mb"] = round(rss.start, 1)
+    results["mixed"]["rss_peak_mb"] = round(rss.peak, 1)
+
+    # Memory is only attributable per endpoint when it runs alone
+    for name, path, _ in plan:
+        with RssSampler() as rss:
+            isolated = await run_requests(client, [(name, path, 1)], args.concurrency, args.applications,
+                                          args.isolated_duration)
+        stats = isolated["endpoints"].get(name, {})
+        stats.update(rss_start_mb=round(rss.start, 1), rss_peak_mb=round(rss.peak, 1),
+                     rss_growth_mb=round(rss.peak - rss.start, 1))
+        results["isolated"][name] = stats
+    return results
+
+
+async def run_in_process(args, plan: list) -> dict:
+    os.environ.setdefault("DATABASE_URL", "mysql://bench@localhost:3306/bench")
+    from benchmarks.fake_db import FakeStoredProcedures, install
+
+    seed_start = time.perf_counter()
+    fake = FakeStoredProcedures(trades=args.trades, doc_meta=args.doc_meta, applications=args.applications,
+                                base_ms=args.base_ms, per_row_us=args.per_row_us)
+    install(fake)
+    seed_s = time.perf_counter() - seed_start
+
+    import main
+
+    async with main.app.router.lifespan_context(main.app):
+        results = await run_suite(AsgiClient(main.app), args, plan)
+    results["seed_s"] = round(seed_s, 1)
+    results["sp_calls"] = fake.calls
+    return results
+
+
+def compare(current: dict, previous_path: str):
+    with open(previous_path) as previous_file:
+        previous = json.load(previous_file)
+    print(f"\nvs {previous_path}:")
+    for name, stats in current["results"]["mixed"]["endpoints"].items():
+        before = previous["results"]["mixed"]["endpoints"].get(name)
+        if not before:
+            continue
+        print(f"  {name:28s} rps {before['throughput_rps']:>8} -> {stats['throughput_rps']:>8}   "
+              f"p99 {before['p99_ms']:>8} -> {stats['p99_ms']:>8} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="benchmark a running service over HTTP instead of the in-process fake DB")
+    parser.add_argument("--trades", type=int, default=1000000)
+    parser.add_argument("--doc-meta", type=int, default=100000)
+    parser.add_argument("--applications", type=int, default=5000)
+    parser.add_argument("--base-ms", type=float, default=2.0, help="emulated SP latency per call")
+    parser.add_argument("--per-row-us", type=float, default=0.5, help="emulated SP latency per returned row")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds of mixed load")
+    parser.add_argument("--isolated-duration", type=float, default=3.0, help="seconds per endpoint for memory")
+    parser.add_argument("--include-full-trades", action="store_true",
+                        help="also request the unpaged /list_all_trades (very large with 1M trades)")
+    parser.add_argument("--output", default=None, help="JSON results path (default benchmarks/results/<time>.json)")
+    parser.add_argument("--compare", help="previous results JSON to compare against")
+    args = parser.parse_args()
+
+    plan = ENDPOINTS + ([FULL_TRADES] if args.include_full_trades else [])
+    if args.url:
+        results = asyncio.run(run_suite(HttpClient(args.url, args.concurrency), args, plan))
+    else:
+        results = asyncio.run(run_in_process(args, plan))
+
+    report = {"timestamp": datetime.now().isoformat(timespec="seconds"),
+              "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+              "results": results}
+    output = args.output or os.path.join("benchmarks", "results",
+                                         f"load_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as output_file:
+        json.dump(report, output_file, indent=2)
+
+    mixed = results["mixed"]
+    print(f"mixed: {mixed['requests']} requests in {mixed['elapsed_s']}s, {mixed['throughput_rps']} rps, "
+          f"rss peak {mixed['rss_peak_mb']} MB")
+    for name, stats in mixed["endpoints"].items():
+        print(f"  {name:28s} {stats['throughput_rps']:>8} rps  p50 {stats['p50_ms']:>8}  p95 {stats['p95_ms']:>8}  "
+              f"p99 {stats['p99_ms']:>8} ms  errors {stats['errors']}")
+    print(f"saved {output}")
+
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == "__main__":
+    main()
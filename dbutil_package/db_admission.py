@@ -0,0 +1,53 @@
+import math
+
+from dbutil_package.db_metrics import metrics
+from dbutil_package.fast_json import FastJSONResponse
+
+
+class AdmissionMiddleware:
+    """ASGI middleware shedding requests with 503 + Retry-After before they queue for the DB.
+
+    A request is rejected when more than `max_queued` retriever calls already wait for the DB executor, or when the
+    DB circuit breaker is open. Paths starting with one of `stale_paths` are still admitted while the breaker is open
+    because the retriever serves them from stale cache; `exempt_paths` (probes, stats) are never shed. Until `ready()`
+    returns True (e.g. the retriever is not built yet) every other request gets a 503, so nothing builds it from the
+    event loop.
+    """
+
+    def __init__(self, app, executor, breaker, max_queued: int, retry_after: float = 1.0, exempt_paths=(),
+                 stale_paths=(), ready=None):
+        self.app = app
+        self.executor = executor
+        self.breaker = breaker
+        self.max_queued = max_queued
+        self.retry_after = retry_after
+        self.exempt_paths = frozenset(exempt_paths)
+        self.stale_paths = tuple(stale_paths)
+        self.ready = ready
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.exempt_paths:
+            await self.app(scope, receive, send)
+            return
+
+        if self.ready is not None and not self.ready():
+            await self._reject(scope, receive, send, "starting", "STARTING", "Service is starting, retry later",
+                               self.retry_after)
+            return
+        if self.max_queued and self.executor.waiting >= self.max_queued:
+            await self._reject(scope, receive, send, "overloaded", "OVERLOADED",
+                               f"Too many queued database calls ({self.executor.waiting}), retry later",
+                               self.retry_after)
+            return
+        if self.breaker is not None and self.breaker.is_open() and not scope["path"].startswith(self.stale_paths):
+            await self._reject(scope, receive, send, "circuit_open", "DB_UNAVAILABLE",
+                               "Database unavailable, retry later", self.breaker.retry_after() or self.retry_after)
+            return
+        await self.app(scope, receive, send)
+
+    @staticmethod
+    async def _reject(scope, receive, send, reason: str, error_code: str, message: str, retry_after: float):
+        metrics.requests_shed.inc(reason)
+        response = FastJSONResponse({"status": "error", "message": message, "error_code": error_code},
+                                    status_code=503, headers={"Retry-After": str(max(1, math.ceil(retry_after)))})
+        await response(scope, receive, send)
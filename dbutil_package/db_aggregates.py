@@ -0,0 +1,268 @@
+import bisect
+import threading
+import time
+from datetime import date, datetime
+from decimal import Decimal
+
+try:
+    import numpy as np
+except ImportError:  # listed in requirements.txt, without it rebuilds fall back to a per-row loop
+    np = None
+
+
+# Amounts are summed exactly as integers in units of 10 ** -AMOUNT_PLACES (cents)
+AMOUNT_PLACES = 2
+
+
+def _key(value):
+    # posting dates group per day and go out as ISO strings, like the JSON rendering of the trade list
+    if isinstance(value, datetime):
+        return value.date().isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+
+class MissingColumnsError(Exception):
+    pass
+
+
+def _amount(units: int) -> str:
+    """Fixed-point string of an amount in units, e.g. "12345678901234567.89": exact, unlike a JSON float."""
+    return format(Decimal(units).scaleb(-AMOUNT_PLACES), "f")
+
+
+def _units(amount) -> int:
+    """`amount` (Decimal, int or float) in whole units of 10 ** -AMOUNT_PLACES."""
+    if amount is None:
+        return 0
+    if isinstance(amount, int):
+        return amount * 10 ** AMOUNT_PLACES
+    return int(Decimal(amount).scaleb(AMOUNT_PLACES).to_integral_value())
+
+
+def _group_sums(keys: list, units: list):
+    """(key, count, amount units sum) per distinct key of one batch."""
+    if np is not None:
+        try:
+            uniques, inverse = np.unique(np.asarray(keys), return_inverse=True)
+        except TypeError:
+            # None mixed with values does not sort, count this batch row by row
+            pass
+        else:
+            counts = np.bincount(inverse, minlength=len(uniques))
+            try:
+                amounts = np.asarray(units, dtype=np.int64)
+            except OverflowError:
+                amounts = None
+            # summed as int64 in key order, exact while no batch total can overflow it
+            if amounts is not None and float(np.abs(amounts).sum(dtype=np.float64)) < 2 ** 62:
+                starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+                sums = np.add.reduceat(amounts[np.argsort(inverse, kind="stable")], starts)
+                return zip(uniques.tolist(), counts.tolist(), sums.tolist())
+
+    groups = {}
+    for key, amount in zip(keys, units):
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = [0, 0]
+        group[0] += 1
+        group[1] += amount
+    return ((key, count, total) for key, (count, total) in groups.items())
+
+
+class _TradeIssuers:
+    """Sorted trade_id -> issuer_id lookup, numpy arrays when available (16 bytes a trade), lists otherwise."""
+
+    def __init__(self, trade_ids: list, issuer_ids: list):
+        if np is not None:
+            try:
+                trade_ids, issuer_ids = np.asarray(trade_ids, dtype=np.int64), np.asarray(issuer_ids, dtype=np.int64)
+            except (TypeError, ValueError):
+                pass
+            else:
+                order = np.argsort(trade_ids, kind="stable")
+                self.trade_ids, self.issuer_ids = trade_ids[order], issuer_ids[order]
+                return
+        order = sorted(range(len(trade_ids)), key=trade_ids.__getitem__)
+        self.trade_ids = [trade_ids[index] for index in order]
+        self.issuer_ids = [issuer_ids[index] for index in order]
+
+    def get(self, trade_id):
+        if trade_id is None:
+            return None
+        index = bisect.bisect_left(self.trade_ids, trade_id)
+        if index < len(self.trade_ids) and self.trade_ids[index] == trade_id:
+            issuer_id = self.issuer_ids[index]
+            return issuer_id.item() if hasattr(issuer_id, "item") else issuer_id
+        return None
+
+    def __len__(self):
+        return len(self.trade_ids)
+
+
+class TradeAggregates:
+    """Counts and amount sums of the trade list per issuer, transaction type, posting date and direction.
+
+    The trade list is the source of truth: each rebuild replaces the summaries with the trade list as read from the
+    DB (vectorized with numpy). Transactions posted through this process are added on top, but only
+    those whose posting started after that read's snapshot, so a transaction is never counted twice. One posted while
+    the snapshot was being taken may be missing until the next rebuild. The response `data` of a dimension is built
+    once and reused until the summaries change, like the required documents index.
+    """
+
+    DIMENSIONS = ("issuer_id", "trans_type_id", "posting_date", "withdrawal_deposit")
+    AMOUNT_COLUMN = "amount"
+    TRADE_ID_COLUMN = "trade_id"
+    REC_TYPE_KEY = "TRADE_AGGREGATES"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # dimension -> {key: [count, amount units sum]}
+        self._groups = {dimension: {} for dimension in self.DIMENSIONS}
+        # posted transactions carry a trade_id but no issuer, they are placed by the issuer of their trade
+        self._trade_issuers = _TradeIssuers([], [])
+        # time.monotonic() by which the trade list of the summaries was read, nothing is added before the first one
+        self._snapshot_at = float("inf")
+        # transactions posted after the snapshot of the rebuild in progress, added to its summaries when it completes
+        self._pending_snapshot_at = None
+        self._pending = []
+        # dimension -> response data, dropped when the summaries change
+        self._resolved = {}
+        self.built_at = None
+        self.built_at_iso = None
+        self.rebuild_seconds = None
+        self.rebuilds = 0
+        # why the last rebuild failed, None once one succeeds
+        self.last_error = None
+        self.incremental_rows = 0
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self.built_at if self.built_at is not None else float("inf")
+
+    def rebuild(self, batches):
+        """Replace the summaries from a `stream_sp` shaped iterator: column names, then batches of row tuples."""
+        start = time.perf_counter()
+        columns = next(batches, None) or []
+        # the DB read its snapshot before the first result came back, later postings are not in it
+        with self._lock:
+            self._pending_snapshot_at = time.monotonic()
+            self._pending = []
+        try:
+            groups, trade_issuers = self._summarize(columns, batches)
+        except BaseException as e:
+            with self._lock:
+                self._pending_snapshot_at, self._pending = None, []
+                self.last_error = str(e) or type(e).__name__
+            raise
+
+        with self._lock:
+            for transaction in self._pending:
+                self._count(groups, trade_issuers, transaction)
+            self._groups, self._trade_issuers, self._resolved = groups, trade_issuers, {}
+            self._snapshot_at, self._pending_snapshot_at, self._pending = self._pending_snapshot_at, None, []
+            self.built_at = time.monotonic()
+            self.built_at_iso = datetime.now().isoformat(timespec="seconds")
+            self.rebuild_seconds = round(time.perf_counter() - start, 3)
+            self.rebuilds += 1
+            self.last_error = None
+
+    def _check_columns(self, columns: list):
+        required = (self.TRADE_ID_COLUMN, self.AMOUNT_COLUMN) + self.DIMENSIONS
+        missing = [column for column in required if column not in columns]
+        if missing:
+            raise MissingColumnsError(f"sp_trade_list_all returns no {', '.join(missing)} column "
+                                      f"(columns: {', '.join(map(str, columns)) or 'none'})")
+
+    def _summarize(self, columns: list, batches):
+        positions = {column: index for index, column in enumerate(columns)}
+        groups = {dimension: {} for dimension in self.DIMENSIONS}
+        trade_ids, issuer_ids = [], []
+        if columns:
+            self._check_columns(columns)
+        for rows in batches:
+            if not rows:
+                continue
+            if not columns:
+                self._check_columns(columns)
+            units = [_units(row[positions[self.AMOUNT_COLUMN]]) for row in rows]
+            for dimension in self.DIMENSIONS:
+                index = positions[dimension]
+                keys = [_key(row[index]) for row in rows]
+                summary = groups[dimension]
+                for key, count, amount in _group_sums(keys, units):
+                    group = summary.get(key)
+                    if group is None:
+                        summary[key] = [count, amount]
+                    else:
+                        group[0] += count
+                        group[1] += amount
+            trade_ids.extend(row[positions[self.TRADE_ID_COLUMN]] for row in rows)
+            issuer_ids.extend(row[positions["issuer_id"]] for row in rows)
+        return groups, _TradeIssuers(trade_ids, issuer_ids)
+
+    def add_transactions(self, transactions: list, posted_at: float):
+        """Count in posted transactions (TRANSACTION_KEYS dicts) whose posting started at `posted_at`
+        (time.monotonic()). Ones that may already be in the trade list the summaries were built from are left out."""
+        with self._lock:
+            if posted_at >= self._snapshot_at:
+                for transaction in transactions:
+                    self._count(self._groups, self._trade_issuers, transaction)
+                self.incremental_rows += len(transactions)
+                self._resolved = {}
+            if self._pending_snapshot_at is not None and posted_at >= self._pending_snapshot_at:
+                self._pending.extend(transactions)
+
+    @staticmethod
+    def _count(groups: dict, trade_issuers: _TradeIssuers, transaction: dict):
+        keys = {
+            "issuer_id": trade_issuers.get(transaction.get("trade_id")),
+            "trans_type_id": transaction.get("trans_type_id"),
+            "posting_date": _key(transaction.get("posting_date")),
+            "withdrawal_deposit": transaction.get("withdrawal_deposit"),
+        }
+        amount = _units(transaction.get(TradeAggregates.AMOUNT_COLUMN))
+        for dimension, key in keys.items():
+            group = groups[dimension].setdefault(key, [0, 0])
+            group[0] += 1
+            group[1] += amount
+
+    def resolve(self, group_by: str) -> dict:
+        """Envelope `data` for one dimension: a row per key (sorted, unknown key last) and the overall total.
+
+        Amounts are fixed-point strings with AMOUNT_PLACES places, exact at any size.
+        """
+        with self._lock:
+            data = self._resolved.get(group_by)
+            if data is not None:
+                return data
+
+            summary = self._groups[group_by]
+            keys = sorted(key for key in summary if key is not None)
+            if None in summary:
+                keys.append(None)
+            rows = [{group_by: key, "count": summary[key][0],
+                     "amount": _amount(summary[key][1])} for key in keys]
+            data = {
+                self.REC_TYPE_KEY: rows,
+                "group_by": group_by,
+                "total": {"count": sum(group[0] for group in summary.values()),
+                          "amount": _amount(sum(group[1] for group in summary.values()))},
+                "built_at": self.built_at_iso,
+            }
+            self._resolved[group_by] = data
+            return data
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "groups": {dimension: len(summary) for dimension, summary in self._groups.items()},
+                "trades_indexed": len(self._trade_issuers),
+                "age_s": round(self.age, 1) if self.built_at is not None else None,
+                "rebuild_seconds": self.rebuild_seconds,
+                "rebuilds": self.rebuilds,
+                "last_error": self.last_error,
+                "rebuilding": self._pending_snapshot_at is not None,
+                "incremental_rows": self.incremental_rows,
+            }
@@ -0,0 +1,99 @@
+import logging
+import math
+import os
+import threading
+import time
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Fails DB calls fast after `failure_threshold` consecutive connection-level failures.
+
+    Open for `reset_seconds`, then half-open: one trial call is let through, its success closes the breaker and its
+    failure opens it again. Only errors that say the DB is unreachable or too slow should be recorded as failures,
+    not SP-level errors such as a rejected duplicate key.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_seconds: float = 10.0, name: str = "db"):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.name = name
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.rejected = 0
+
+    @classmethod
+    def from_env(cls, name: str = "db"):
+        return cls(failure_threshold=int(os.getenv("DB_BREAKER_FAILURES", "5")),
+                   reset_seconds=float(os.getenv("DB_BREAKER_RESET_SECONDS", "10")), name=name)
+
+    @property
+    def state(self) -> str:
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_seconds:
+            return self.HALF_OPEN
+        return self._state
+
+    def retry_after(self) -> float:
+        if self._state != self.OPEN:
+            return 0.0
+        return max(0.0, self.reset_seconds - (time.monotonic() - self._opened_at))
+
+    def is_open(self) -> bool:
+        """True while calls would be rejected; cheap enough to check per request before doing any work."""
+        return self.state == self.OPEN or (self.state == self.HALF_OPEN and self._trial_in_flight)
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == self.CLOSED:
+                return
+            if state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return
+        self._reject()
+
+    def _reject(self):
+        with self._lock:
+            self.rejected += 1
+        retry_after = self.retry_after() or self.reset_seconds
+        raise CircuitOpenError(f"Database circuit {self.name} is open, retry in {math.ceil(retry_after)}s", retry_after)
+
+    def record_success(self):
+        with self._lock:
+            if self._state != self.CLOSED:
+                logging.info(f"Database circuit {self.name} closed")
+            self._state = self.CLOSED
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self, error: Exception):
+        with self._lock:
+            self._failures += 1
+            trial = self._trial_in_flight
+            self._trial_in_flight = False
+            if trial or (self._state == self.CLOSED and self._failures >= self.failure_threshold):
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self.opened += 1
+                logging.error(f"Database circuit {self.name} opened for {self.reset_seconds}s after "
+                              f"{self._failures} failures: {error}")
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self._failures,
+            "opened": self.opened,
+            "rejected": self.rejected,
+            "retry_after_s": round(self.retry_after(), 1),
+        }
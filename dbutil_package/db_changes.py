@@ -0,0 +1,131 @@
+import asyncio
+import threading
+
+from dbutil_package.fast_json import dumps
+
+
+class Subscription:
+    """One change feed client: a bounded queue of encoded SSE events for a set of app_ids."""
+
+    def __init__(self, app_ids, queue_size: int):
+        self.app_ids = frozenset(app_ids)
+        self.queue = asyncio.Queue(maxsize=queue_size)
+
+    def put(self, event: bytes) -> bool:
+        """Queue `event`, or replace everything queued with one resync event when the client fell behind."""
+        try:
+            self.queue.put_nowait(event)
+            return True
+        except asyncio.QueueFull:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RuleChangeFeed.encode("resync", {"app_ids": sorted(self.app_ids)}))
+            return False
+
+    async def get(self) -> bytes:
+        return await self.queue.get()
+
+
+class RuleChangeFeed:
+    """In-process pub/sub of application rule changes, fanned out to Server-Sent Events subscribers.
+
+    Keeps the last known rules of every subscribed app_id. Writers and the poller hand it full rule rows through
+    `publish_rows` from any thread; only rows that differ from the known ones are pushed, so a change seen by both a
+    local write and the next poll goes out once. Each event is encoded once and shared by all its subscribers.
+    """
+
+    def __init__(self, key_column: str = "ruleId", queue_size: int = 256):
+        self.key_column = key_column
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._loop = None
+        # app_id -> set of Subscription
+        self._subscribers = {}
+        # app_id -> {rule key: row}, dropped with the last subscriber of the app_id
+        self._known = {}
+        self.subscriptions = 0
+        self.published = 0
+        self.delivered = 0
+        self.resyncs = 0
+
+    @staticmethod
+    def encode(event: str, data: dict) -> bytes:
+        return b"event: " + event.encode() + b"\ndata: " + dumps(data) + b"\n\n"
+
+    def bind(self, loop: asyncio.AbstractEventLoop):
+        """Subscriber queues belong to `loop`, publishes from DB threads are handed over to it."""
+        self._loop = loop
+
+    def subscribe(self, app_ids) -> Subscription:
+        subscription = Subscription(app_ids, self.queue_size)
+        with self._lock:
+            self.subscriptions += 1
+            for app_id in subscription.app_ids:
+                self._subscribers.setdefault(app_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            self.subscriptions -= 1
+            for app_id in subscription.app_ids:
+                subscribers = self._subscribers.get(app_id)
+                if subscribers is None:
+                    continue
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[app_id]
+                    self._known.pop(app_id, None)
+
+    def is_subscribed(self, app_id) -> bool:
+        return app_id in self._subscribers
+
+    def subscribed_app_ids(self) -> list:
+        with self._lock:
+            return list(self._subscribers)
+
+    def publish_rows(self, app_id, rows: list, complete: bool = False):
+        """Push the rows of `app_id` that changed since last seen. `complete` rows are the app's whole rules view.
+
+        The first complete view of an app_id only becomes the baseline, partial rows before that are dropped since
+        there is nothing to diff them against.
+        """
+        with self._lock:
+            if app_id not in self._subscribers:
+                return
+            known = self._known.get(app_id)
+            if known is None:
+                if complete:
+                    self._known[app_id] = {row.get(self.key_column): row for row in rows}
+                return
+            changed = []
+            for row in rows:
+                key = row.get(self.key_column)
+                if known.get(key) != row:
+                    known[key] = row
+                    changed.append(row)
+            if not changed:
+                return
+            self.published += 1
+            # scheduled under the lock so events of one app_id reach subscribers in diff order
+            if self._loop is not None and not self._loop.is_closed():
+                self._loop.call_soon_threadsafe(self._fan_out, app_id,
+                                                self.encode("rules", {"app_id": app_id, "rules": changed}))
+
+    def _fan_out(self, app_id, event: bytes):
+        with self._lock:
+            subscribers = list(self._subscribers.get(app_id, ()))
+        for subscription in subscribers:
+            if subscription.put(event):
+                self.delivered += 1
+            else:
+                self.resyncs += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "app_ids": len(self._subscribers),
+                "subscriptions": self.subscriptions,
+                "published": self.published,
+                "delivered": self.delivered,
+                "resyncs": self.resyncs,
+            }
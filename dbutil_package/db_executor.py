@@ -0,0 +1,77 @@
+import asyncio
+import contextvars
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+
+class DBExecutor:
+    """Runs blocking retriever calls on a bounded thread pool so they never block the event loop.
+
+    `max_workers` is the number of DB threads, `max_concurrency` caps how many calls may be
+    dispatched at once; any extra callers wait on the event loop instead of queueing in the pool.
+    """
+
+    def __init__(self, max_workers: int = None, max_concurrency: int = None):
+        self.max_workers = max_workers or int(os.getenv("DB_EXECUTOR_WORKERS", "16"))
+        self.max_concurrency = max_concurrency or int(os.getenv("DB_MAX_CONCURRENCY", str(self.max_workers)))
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="db-worker")
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        # calls one request may have dispatched or queued at once, kept well under the admission queue limit
+        self.fanout_limit = int(os.getenv("DB_REQUEST_FANOUT", str(max(1, self.max_concurrency // 2))))
+        self.in_flight = 0
+        self.waiting = 0
+
+    async def run(self, fn, *args, **kwargs):
+        await self.acquire()
+        try:
+            return await self.submit(fn, *args, **kwargs)
+        finally:
+            self.release()
+
+    async def gather(self, calls, limit: int = None, run=None) -> list:
+        """Run `(fn, *args)` calls with at most `limit` (default `fanout_limit`) of them running or queued at once.
+
+        Results come back in call order, exceptions included as values like asyncio.gather(return_exceptions=True).
+        The calls beyond the limit wait here, not on the executor, so one request's fan-out cannot fill the queue the
+        admission middleware sheds on. `run` replaces `self.run` for each call, e.g. to collapse identical reads.
+        """
+        limiter = asyncio.Semaphore(limit or self.fanout_limit)
+        run = run or self.run
+
+        async def limited(fn, *args):
+            async with limiter:
+                return await run(fn, *args)
+
+        return await asyncio.gather(*(limited(*call) for call in calls), return_exceptions=True)
+
+    async def acquire(self):
+        """Take a concurrency slot, for work that spans several `submit` calls (e.g. a streamed export)."""
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+
+    def release(self):
+        self.in_flight -= 1
+        self._semaphore.release()
+
+    def submit(self, fn, *args, **kwargs) -> asyncio.Future:
+        """Start `fn` on a DB thread without taking a slot, the caller must already hold one from `acquire`."""
+        loop = asyncio.get_running_loop()
+        # run in a copy of the caller's context so log records from DB threads keep the request id
+        context = contextvars.copy_context()
+        return loop.run_in_executor(self._executor, functools.partial(context.run, fn, *args, **kwargs))
+
+    def stats(self) -> dict:
+        return {
+            "max_workers": self.max_workers,
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+        }
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)
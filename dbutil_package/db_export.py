@@ -0,0 +1,85 @@
+import csv
+import io
+import logging
+import threading
+
+from dbutil_package.fast_json import dumps
+
+
+# Export dataset -> (SP, needs app_id)
+EXPORT_DATASETS = {
+    "trades": ("sp_trade_list_all", False),
+    "trade_docs_meta": ("sp_trade_documents_meta_list", False),
+    "app_doc_uploads": ("sp_stxstage_app_docs_uploads", True),
+}
+
+
+def ndjson_lines(columns: list, batches):
+    """Turn the column names and row batches of `stream_sp` into NDJSON chunks, one per batch."""
+    for rows in batches:
+        yield b"".join(dumps(dict(zip(columns, row))) + b"\n" for row in rows)
+
+
+def csv_lines(columns: list, batches):
+    """Same as `ndjson_lines` but CSV with a header row."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    yield buffer.getvalue()
+    for rows in batches:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(rows)
+        yield buffer.getvalue()
+
+
+class ExportStream:
+    """Response body of a streamed export, read chunk by chunk on the DB executor.
+
+    The caller takes an executor slot (`DBExecutor.acquire`) before opening the stream; it is held until the stream is
+    closed, so exports count against DB_MAX_CONCURRENCY like any other DB call. `close` is safe to call more than once,
+    including from a background task when the client went away before the body started.
+    """
+
+    def __init__(self, executor, batches, chunks):
+        self.executor = executor
+        self.batches = batches
+        self.chunks = chunks
+        # a chunk read cancelled by a disconnect keeps running on its DB thread, close waits for it
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _next_chunk(self):
+        with self._lock:
+            return next(self.chunks, None)
+
+    def _close_batches(self):
+        with self._lock:
+            self.chunks.close()
+            # returns the connection to the pool, or discards it when rows were left unread
+            self.batches.close()
+
+    async def body(self):
+        try:
+            while True:
+                chunk = await self.executor.submit(self._next_chunk)
+                if chunk is None:
+                    return
+                yield chunk
+        finally:
+            self.close()
+
+    async def aclose(self):
+        self.close()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        # not awaited, a cancelled request task cannot wait; the slot is given back once the connection is released
+        self.executor.submit(self._close_batches).add_done_callback(self._closed_batches)
+
+    def _closed_batches(self, future):
+        self.executor.release()
+        if not future.cancelled() and future.exception() is not None:
+            logging.error(f"Failed to close export stream: {future.exception()}")
@@ -0,0 +1,174 @@
+import bisect
+import logging
+import os
+import threading
+import time
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+ROWS_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000, 1000000)
+BYTES_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _label_str(names, values, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount: float = 1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_label_str(self.label_names, label_values)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, label_names=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        # label values -> [bucket counts..., +Inf count, sum]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for label_values, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + ("+Inf",), series[:-1]):
+                    cumulative += count
+                    le = f'le="{bound}"'
+                    lines.append(f"{self.name}_bucket{_label_str(self.label_names, label_values, le)} {cumulative}")
+                labels = _label_str(self.label_names, label_values)
+                lines.append(f"{self.name}_sum{labels} {series[-1]}")
+                lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Process-wide request and stored-procedure metrics, rendered in Prometheus text format.
+
+    Collectors registered with `register_collector` are called at render time and return gauge samples as
+    (name, help, [(labels dict, value), ...]) tuples, used for pool, executor and cache state.
+    """
+
+    def __init__(self):
+        self.request_latency = Histogram("http_request_duration_seconds", "HTTP request latency per route",
+                                         ("route", "method", "status"))
+        self.response_bytes = Histogram("http_response_size_bytes", "Serialized response payload size per route",
+                                        ("route",), buckets=BYTES_BUCKETS)
+        self.sp_latency = Histogram("db_sp_duration_seconds", "Stored procedure execution time", ("sp", "status"))
+        self.sp_rows = Histogram("db_sp_rows", "Rows returned per stored procedure call", ("sp",),
+                                 buckets=ROWS_BUCKETS)
+        self.pool_wait = Histogram("db_pool_wait_seconds", "Time spent waiting for a pooled connection", ("pool",))
+        self.projection_saved = Histogram("db_projection_saved_bytes",
+                                          "Bytes saved by ?fields= projection, sampled", ("rec_type_key",),
+                                          buckets=BYTES_BUCKETS)
+        self.slow_sp = Counter("db_sp_slow_total", "Stored procedure calls over the slow query threshold", ("sp",))
+        self.slow_sp_threshold = float(os.getenv("SLOW_SP_THRESHOLD_MS", "1000")) / 1000
+        self.requests_shed = Counter("http_requests_shed_total", "Requests rejected with 503 by admission control",
+                                     ("reason",))
+        self._metrics = [self.request_latency, self.response_bytes, self.sp_latency, self.sp_rows, self.pool_wait,
+                         self.projection_saved, self.slow_sp, self.requests_shed]
+        self._collectors = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector):
+        self._collectors.append(collector)
+
+    def observe_sp(self, sp: str, seconds: float, rows: int, status: str = "success"):
+        self.sp_latency.observe(seconds, sp, status)
+        self.sp_rows.observe(rows, sp)
+        if self.slow_sp_threshold and seconds >= self.slow_sp_threshold:
+            self.slow_sp.inc(sp)
+            logging.warning(f"Slow stored procedure {sp}: {seconds * 1000:.1f} ms, {rows} rows",
+                            extra={"sp": sp, "duration_ms": round(seconds * 1000, 2), "rows": rows, "status": status})
+        elif logging.root.isEnabledFor(logging.DEBUG):
+            logging.debug(f"Stored procedure {sp}",
+                          extra={"sp": sp, "duration_ms": round(seconds * 1000, 2), "rows": rows, "status": status})
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            try:
+                samples = collector()
+            except Exception as e:
+                logging.error(f"Metrics collector failed: {e}")
+                continue
+            for name, help_text, values in samples:
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} gauge")
+                for labels, value in values:
+                    lines.append(f"{name}{_label_str(labels.keys(), labels.values())} {value}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency and response body size per route template.
+
+    `route_paths` maps endpoint functions to their path template, so /lookup_client/1 and /lookup_client/2
+    share one series. Requests that match no route are recorded as "unmatched".
+    """
+
+    def __init__(self, app, route_paths):
+        self.app = app
+        self.route_paths = route_paths
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        response = {"status": 500, "bytes": 0}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+            elif message["type"] == "http.response.body":
+                response["bytes"] += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = self.route_paths().get(scope.get("endpoint"), "unmatched")
+            metrics.request_latency.observe(time.perf_counter() - start, route, scope["method"], response["status"])
+            metrics.response_bytes.observe(response["bytes"], route)
@@ -0,0 +1,335 @@
+import heapq
+import itertools
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from urllib.parse import urlparse, unquote
+
+import mysql.connector
+from dotenv import load_dotenv
+
+from dbutil_package.db_metrics import metrics
+
+
+class PoolTimeoutError(Exception):
+    pass
+
+
+class QueryTimeoutError(Exception):
+    pass
+
+
+def _env_bool(name: str, default: str) -> bool:
+    return os.getenv(name, default).strip().lower() in ("1", "true", "yes", "on")
+
+
+def connection_config_from_url(url: str, password: str = None) -> dict:
+    """Turn `mysql://<username>@<host>:<port>/<database_name>` into mysql.connector kwargs."""
+    parsed = urlparse(url)
+    config = {
+        "host": parsed.hostname or "localhost",
+        "port": parsed.port or 3306,
+        "user": unquote(parsed.username) if parsed.username else None,
+        "database": parsed.path.lstrip("/") or None,
+    }
+    if parsed.password:
+        config["password"] = unquote(parsed.password)
+    if password is not None:
+        config["password"] = password
+    return {key: value for key, value in config.items() if value is not None}
+
+
+class _Deadline:
+    __slots__ = ("connection_id", "done", "fired")
+
+    def __init__(self, connection_id: int):
+        self.connection_id = connection_id
+        self.done = False
+        self.fired = False
+
+
+class QueryWatchdog:
+    """Enforces statement deadlines from one background thread.
+
+    A statement still running when its deadline passes is interrupted with `kill(connection_id)`. Finishing a
+    watched statement is a flag flip, so a deadline per SP call costs no thread or timer of its own.
+    """
+
+    def __init__(self, kill, name: str = "primary"):
+        self._kill = kill
+        self._heap = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name=f"query-watchdog-{name}", daemon=True)
+        self._thread.start()
+        self.killed = 0
+
+    def watch(self, connection_id: int, timeout: float) -> _Deadline:
+        deadline = _Deadline(connection_id)
+        with self._cond:
+            heapq.heappush(self._heap, (time.monotonic() + timeout, next(self._seq), deadline))
+            self._cond.notify()
+        return deadline
+
+    def finish(self, deadline: _Deadline) -> bool:
+        """Stop watching, return whether the statement was killed (its connection must not be reused)."""
+        with self._cond:
+            deadline.done = True
+            return deadline.fired
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    while self._heap and self._heap[0][2].done:
+                        heapq.heappop(self._heap)
+                    if not self._heap:
+                        self._cond.wait()
+                        continue
+                    remaining = self._heap[0][0] - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                deadline = heapq.heappop(self._heap)[2]
+                deadline.fired = True
+                self.killed += 1
+            self._kill(deadline.connection_id)
+
+
+class ConnectionPool:
+    """Thread-safe MySQL connection pool with checkout timeout, recycle and pre-ping of idle connections.
+
+    Connections are handed out LIFO so the hottest connection is reused first and cold ones age out
+    through `recycle_seconds`. A connection idle for longer than `ping_after_seconds` is pinged before
+    being handed out; a failed ping replaces it with a fresh connection.
+    """
+
+    def __init__(self, connection_config: dict, min_size: int = 2, max_size: int = 16,
+                 checkout_timeout: float = 5.0, recycle_seconds: float = 1800.0,
+                 pre_ping: bool = True, ping_after_seconds: float = 30.0, name: str = "primary"):
+        if min_size > max_size:
+            raise ValueError("min_size must not exceed max_size")
+        self.connection_config = connection_config
+        self.min_size = min_size
+        self.max_size = max_size
+        self.checkout_timeout = checkout_timeout
+        self.recycle_seconds = recycle_seconds
+        self.pre_ping = pre_ping
+        self.ping_after_seconds = ping_after_seconds
+        self.name = name
+
+        self._lock = threading.Condition()
+        self._watchdog = None
+        # idle entries: (connection, last_used_at), creation time is tracked per connection id
+        self._idle = deque()
+        self._created_at = {}
+        self._size = 0
+        self._filled = False
+
+        self._checkouts = 0
+        self._timeouts = 0
+        self._created = 0
+        self._recycled = 0
+        self._ping_failures = 0
+        self._wait_time_total = 0.0
+        self._wait_time_max = 0.0
+
+    @classmethod
+    def from_env(cls, url_env: str = "DATABASE_URL", password_env: str = "DATABASE_PASSWORD",
+                 name: str = "primary", url: str = None):
+        """Pool settings from DB_POOL_* env vars. `url` overrides `url_env`; a missing `password_env` falls back to
+        DATABASE_PASSWORD."""
+        load_dotenv()
+        password = os.getenv(password_env, os.getenv("DATABASE_PASSWORD"))
+        config = connection_config_from_url(url or os.environ[url_env], password)
+        return cls(
+            config,
+            min_size=int(os.getenv("DB_POOL_MIN_SIZE", "2")),
+            max_size=int(os.getenv("DB_POOL_MAX_SIZE", "16")),
+            checkout_timeout=float(os.getenv("DB_POOL_TIMEOUT", "5")),
+            recycle_seconds=float(os.getenv("DB_POOL_RECYCLE", "1800")),
+            pre_ping=_env_bool("DB_POOL_PRE_PING", "true"),
+            ping_after_seconds=float(os.getenv("DB_POOL_PING_AFTER", "30")),
+            name=name,
+        )
+
+    def _connect(self):
+        conn = mysql.connector.connect(**self.connection_config)
+        self._created_at[id(conn)] = time.monotonic()
+        self._created += 1
+        return conn
+
+    def _discard(self, conn):
+        self._created_at.pop(id(conn), None)
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def fill(self):
+        """Open connections up to `min_size`. Called lazily on first checkout or explicitly to warm up."""
+        with self._lock:
+            self._filled = True
+            missing = self.min_size - self._size
+            self._size += max(0, missing)
+        opened = []
+        try:
+            for _ in range(max(0, missing)):
+                opened.append(self._connect())
+        finally:
+            with self._lock:
+                self._size -= max(0, missing) - len(opened)
+                now = time.monotonic()
+                for conn in opened:
+                    self._idle.append((conn, now))
+                self._lock.notify_all()
+
+    def _healthy(self, conn, last_used_at: float) -> bool:
+        now = time.monotonic()
+        if self.recycle_seconds and now - self._created_at.get(id(conn), now) > self.recycle_seconds:
+            self._recycled += 1
+            return False
+        if self.pre_ping and now - last_used_at > self.ping_after_seconds:
+            try:
+                conn.ping(reconnect=False)
+            except Exception as e:
+                logging.warning(f"Discarding stale {self.name} pool connection: {e}")
+                self._ping_failures += 1
+                return False
+        return True
+
+    def checkout(self):
+        if not self._filled:
+            self.fill()
+
+        start = time.monotonic()
+        deadline = start + self.checkout_timeout
+        while True:
+            with self._lock:
+                while not self._idle and self._size >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        raise PoolTimeoutError(
+                            f"Timed out after {self.checkout_timeout}s waiting for a {self.name} DB connection")
+                    self._lock.wait(remaining)
+
+                if self._idle:
+                    conn, last_used_at = self._idle.pop()
+                else:
+                    conn, last_used_at = None, None
+                    self._size += 1
+
+            if conn is None:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._lock:
+                        self._size -= 1
+                        self._lock.notify()
+                    raise
+            elif not self._healthy(conn, last_used_at):
+                self._discard(conn)
+                with self._lock:
+                    self._size -= 1
+                    self._lock.notify()
+                continue
+
+            waited = time.monotonic() - start
+            metrics.pool_wait.observe(waited, self.name)
+            with self._lock:
+                self._checkouts += 1
+                self._wait_time_total += waited
+                self._wait_time_max = max(self._wait_time_max, waited)
+            return conn
+
+    def checkin(self, conn, broken: bool = False):
+        if not broken:
+            try:
+                if conn.in_transaction:
+                    conn.rollback()
+            except Exception:
+                broken = True
+
+        if broken:
+            self._discard(conn)
+            with self._lock:
+                self._size -= 1
+                self._lock.notify()
+            return
+
+        with self._lock:
+            self._idle.append((conn, time.monotonic()))
+            self._lock.notify()
+
+    def kill_query(self, connection_id: int):
+        """Interrupt the statement running on `connection_id`, from a separate connection outside the pool."""
+        try:
+            conn = mysql.connector.connect(**self.connection_config)
+            try:
+                cursor = conn.cursor()
+                cursor.execute(f"KILL QUERY {int(connection_id)}")
+                cursor.close()
+            finally:
+                conn.close()
+        except Exception as e:
+            logging.error(f"Failed to kill timed out query on {self.name} connection {connection_id}: {e}")
+
+    def deadline(self, conn, timeout: float) -> _Deadline:
+        """Kill the statement `conn` runs if it is still running after `timeout` seconds, see QueryWatchdog."""
+        if self._watchdog is None:
+            with self._lock:
+                if self._watchdog is None:
+                    self._watchdog = QueryWatchdog(self.kill_query, self.name)
+        return self._watchdog.watch(conn.connection_id, timeout)
+
+    def finish_deadline(self, deadline: _Deadline) -> bool:
+        return self._watchdog.finish(deadline)
+
+    @contextmanager
+    def connection(self):
+        """Check out a connection for the duration of one unit of work."""
+        conn = self.checkout()
+        broken = False
+        try:
+            yield conn
+        except (mysql.connector.errors.OperationalError, mysql.connector.errors.InterfaceError):
+            broken = True
+            raise
+        finally:
+            self.checkin(conn, broken=broken)
+
+    @property
+    def in_use(self) -> int:
+        return self._size - len(self._idle)
+
+    def stats(self) -> dict:
+        with self._lock:
+            idle = len(self._idle)
+            return {
+                "name": self.name,
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "size": self._size,
+                "idle": idle,
+                "in_use": self._size - idle,
+                "utilisation": round((self._size - idle) / self.max_size, 3),
+                "checkouts": self._checkouts,
+                "timeouts": self._timeouts,
+                "created": self._created,
+                "recycled": self._recycled,
+                "ping_failures": self._ping_failures,
+                "wait_time_total_s": round(self._wait_time_total, 6),
+                "wait_time_max_s": round(self._wait_time_max, 6),
+                "queries_killed": self._watchdog.killed if self._watchdog is not None else 0,
+            }
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = list(self._idle), deque()
+            self._size -= len(idle)
+        for conn, _ in idle:
+            self._discard(conn)
@@ -0,0 +1,123 @@
+import itertools
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from dbutil_package.db_pool import ConnectionPool
+
+
+class ReplicaRouter:
+    """Chooses the pool for a stored procedure call: writes go to the primary, reads to a replica.
+
+    Replicas are balanced round robin or by fewest checked out connections. A replica that fails is skipped for
+    `down_seconds`, and reads fall back to the primary when no replica is usable. For `read_your_writes_seconds`
+    after a write through this process, reads of what it wrote also go to the primary so callers never read behind
+    their own write. Writes and reads name a scope, a (family, key) pair such as ("app_rules", app_id): a write opens
+    the window for reads of the same scope, and a write keyed None for every read of its family. Reads of other
+    families stay on the replicas. A write without a scope (None) opens the window for every read.
+    """
+
+    def __init__(self, primary: ConnectionPool, replicas=None, strategy: str = "round_robin",
+                 read_your_writes_seconds: float = 5.0, down_seconds: float = 30.0):
+        if strategy not in ("round_robin", "least_connections"):
+            raise ValueError(f"Unknown replica balancing strategy {strategy}")
+        self.primary = primary
+        self.replicas = list(replicas or [])
+        self.strategy = strategy
+        self.read_your_writes_seconds = read_your_writes_seconds
+        self.down_seconds = down_seconds
+        self._round_robin = itertools.cycle(range(len(self.replicas))) if self.replicas else None
+        self._down_until = {}
+        # scope -> time.monotonic() of its last write, oldest first, expired scopes are dropped as writes come in
+        self._writes = OrderedDict()
+        self._lock = threading.Lock()
+        self.primary_reads = 0
+        self.replica_reads = 0
+        self.fallbacks = 0
+
+    @classmethod
+    def from_env(cls, primary: ConnectionPool):
+        urls = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+        replicas = [ConnectionPool.from_env(url_env=None, url=url, name=f"replica-{index}",
+                                            password_env="DATABASE_REPLICA_PASSWORD")
+                    for index, url in enumerate(urls)]
+        return cls(
+            primary,
+            replicas,
+            strategy=os.getenv("DB_REPLICA_BALANCE", "round_robin"),
+            read_your_writes_seconds=float(os.getenv("DB_READ_YOUR_WRITES_SECONDS", "5")),
+            down_seconds=float(os.getenv("DB_REPLICA_DOWN_SECONDS", "30")),
+        )
+
+    def note_write(self, *scopes):
+        """Open the read-your-writes window for `scopes`, for everything when called without one."""
+        now = time.monotonic()
+        with self._lock:
+            for scope in scopes or (None,):
+                self._writes[scope] = now
+                self._writes.move_to_end(scope)
+            while self._writes:
+                scope, written_at = next(iter(self._writes.items()))
+                if now - written_at < self.read_your_writes_seconds:
+                    break
+                del self._writes[scope]
+
+    def _recently_written(self, scope) -> bool:
+        # the read's own scope, a write to its whole family, or a write without a scope
+        candidates = (None,) if scope is None else (scope, (scope[0], None), None)
+        now = time.monotonic()
+        return any(now - self._writes.get(candidate, float("-inf")) < self.read_your_writes_seconds
+                   for candidate in candidates)
+
+    def mark_down(self, pool: ConnectionPool, error: Exception):
+        logging.warning(f"DB {pool.name} unavailable for {self.down_seconds}s, reads fall back: {error}")
+        with self._lock:
+            self._down_until[pool.name] = time.monotonic() + self.down_seconds
+            self.fallbacks += 1
+
+    def _usable_replicas(self) -> list:
+        now = time.monotonic()
+        return [pool for pool in self.replicas if self._down_until.get(pool.name, 0) <= now]
+
+    def pool_for(self, read: bool, scope=None) -> ConnectionPool:
+        if not read or not self.replicas:
+            return self.primary
+        if self._recently_written(scope):
+            self.primary_reads += 1
+            return self.primary
+
+        usable = self._usable_replicas()
+        if not usable:
+            self.primary_reads += 1
+            return self.primary
+
+        if self.strategy == "least_connections":
+            pool = min(usable, key=lambda candidate: candidate.in_use)
+        else:
+            with self._lock:
+                for _ in range(len(self.replicas)):
+                    pool = self.replicas[next(self._round_robin)]
+                    if pool in usable:
+                        break
+        self.replica_reads += 1
+        return pool
+
+    def pools(self) -> list:
+        return [self.primary] + self.replicas
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        return {
+            "strategy": self.strategy,
+            "replicas": [dict(pool.stats(), down=self._down_until.get(pool.name, 0) > now) for pool in self.replicas],
+            "primary_reads": self.primary_reads,
+            "replica_reads": self.replica_reads,
+            "fallbacks": self.fallbacks,
+            "write_scopes": len(self._writes),
+        }
+
+    def close(self):
+        for pool in self.replicas:
+            pool.close()
@@ -0,0 +1,43 @@
+from collections.abc import Sequence
+
+
+class RowSet(Sequence):
+    """Records of one SP result kept as the cursor returned them: one shared column list and a tuple per row.
+
+    Reads like the list of row dicts it replaces (`len`, indexing, iteration and slicing give dicts, built on
+    access), but holds no per-row dict. fast_json turns it into records only while serializing, so a large result
+    costs its tuples rather than a dict per row for as long as it is alive.
+    """
+
+    __slots__ = ("columns", "rows")
+
+    def __init__(self, columns: list, rows: list):
+        self.columns = columns
+        self.rows = rows
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return RowSet(self.columns, self.rows[index])
+        return dict(zip(self.columns, self.rows[index]))
+
+    def __iter__(self):
+        columns = self.columns
+        for row in self.rows:
+            yield dict(zip(columns, row))
+
+    def __eq__(self, other):
+        if isinstance(other, RowSet):
+            return self.columns == other.columns and self.rows == other.rows
+        return isinstance(other, list) and len(other) == len(self.rows) and list(self) == other
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"<RowSet {len(self.rows)} rows x {len(self.columns)} columns>"
+
+    def to_records(self) -> list:
+        columns = self.columns
+        return [dict(zip(columns, row)) for row in self.rows]
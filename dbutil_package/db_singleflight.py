@@ -0,0 +1,53 @@
+import asyncio
+
+
+class SingleFlightTimeout(Exception):
+    pass
+
+
+class SingleFlight:
+    """Collapses concurrent identical calls into one execution, on the event loop.
+
+    The first caller for a key starts the coroutine as a task, callers arriving while it is in flight await that task
+    for up to `wait_timeout` seconds instead of starting their own. Waiting happens on the event loop, so when the
+    coroutine runs a DB executor call only the leader holds an executor slot and thread. The task is shielded: a caller
+    that gives up or disconnects does not cancel it for the others. Nothing is kept once the call finishes, so this only
+    dedupes overlapping work and never serves stale data.
+    """
+
+    def __init__(self, wait_timeout: float = 30.0):
+        self.wait_timeout = wait_timeout
+        self._calls = {}
+        self.executions = 0
+        self.collapsed = 0
+        self.timeouts = 0
+
+    async def do(self, key, fn, *args, **kwargs):
+        task = self._calls.get(key)
+        if task is None:
+            task = self._calls[key] = asyncio.ensure_future(fn(*args, **kwargs))
+            task.add_done_callback(lambda done: self._finished(key, done))
+            self.executions += 1
+            return await asyncio.shield(task)
+
+        self.collapsed += 1
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), self.wait_timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise SingleFlightTimeout(f"Timed out after {self.wait_timeout}s waiting for in-flight call {key[0]}")
+
+    def _finished(self, key, task: asyncio.Future):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            # retrieved here so an error nobody waited for any more is not reported as never retrieved
+            task.exception()
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._calls),
+            "executions": self.executions,
+            "collapsed": self.collapsed,
+            "timeouts": self.timeouts,
+        }
@@ -0,0 +1,72 @@
+import logging
+import mmap
+import os
+import stat
+import tempfile
+import time
+
+from dbutil_package.fast_json import dumps, loads
+
+
+class SnapshotPermissionError(Exception):
+    pass
+
+
+class ReferenceSnapshot:
+    """Reference tables fetched once by the launcher and read by every worker at startup.
+
+    The file holds `{sp: [columns, rows]}` plus the time it was written, as JSON: Decimal, date and datetime values are
+    stored the way responses render them, so cached lists serialize the same. It lives in a directory only this user
+    can access (created 0700), is replaced atomically, so a worker never reads a partial snapshot, and is read through
+    mmap, so all workers parse the file's shared page cache instead of each issuing the same queries. Workers only
+    seed entries that are still within their cache TTL.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    @classmethod
+    def from_env(cls):
+        path = os.getenv("REFERENCE_SNAPSHOT_PATH")
+        return cls(path) if path else None
+
+    @property
+    def directory(self) -> str:
+        return os.path.dirname(os.path.abspath(self.path))
+
+    @staticmethod
+    def _check_private(path: str, is_dir: bool):
+        # lstat: a symlink planted in place of the directory or file is rejected, not followed
+        info = os.lstat(path)
+        kind = stat.S_ISDIR(info.st_mode) if is_dir else stat.S_ISREG(info.st_mode)
+        if not kind or info.st_uid != os.getuid() or info.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+            raise SnapshotPermissionError(f"{path} must be a {'directory' if is_dir else 'file'} owned by uid "
+                                          f"{os.getuid()} and not writable by group or others")
+
+    def publish(self, tables: dict):
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        self._check_private(self.directory, is_dir=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".reference-", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as tmp:
+                tmp.write(dumps({"written_at": time.time(), "tables": tables}))
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def load(self):
+        """Return (tables, age in seconds), or (None, 0.0) when there is no readable snapshot."""
+        try:
+            self._check_private(self.directory, is_dir=True)
+            self._check_private(self.path, is_dir=False)
+            with open(self.path, "rb") as snapshot_file, \
+                    mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped, \
+                    memoryview(mapped) as view:
+                snapshot = loads(view)
+        except FileNotFoundError:
+            return None, 0.0
+        except Exception as e:
+            logging.warning(f"Ignoring unreadable reference snapshot {self.path}: {e}")
+            return None, 0.0
+        return snapshot["tables"], max(0.0, time.time() - snapshot["written_at"])
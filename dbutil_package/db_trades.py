@@ -1,18 +1,673 @@
+import itertools
+import logging
+import os
+import threading
+import time
+
+import mysql.connector
+from mysql.connector import errorcode
+
 from dbutil_package.dbutil.common import DatabaseHandler
+from dbutil_package.db_aggregates import TradeAggregates
+from dbutil_package.db_breaker import CircuitBreaker, CircuitOpenError
+from dbutil_package.db_cache import TTLCache
+from dbutil_package.db_changes import RuleChangeFeed
+from dbutil_package.db_metrics import metrics
+from dbutil_package.db_pool import ConnectionPool, PoolTimeoutError, QueryTimeoutError
+from dbutil_package.db_router import ReplicaRouter
+from dbutil_package.db_rows import RowSet
+from dbutil_package.doc_requirements import RequiredDocsIndex
+from dbutil_package.fast_json import dumps
 
 
 class AppRulesDataRetriever(DatabaseHandler):
     class DeleteRepError(Exception):
         pass
 
-    def __init__(self):
+    class DatabaseLookupError(Exception):
+        pass
+
+    # SPs that modify data: always run on the primary and open the read-your-writes window
+    WRITE_SPS = frozenset([
+        "sp_reg_rule_review_update",
+        "sp_trade_documents_meta_create",
+        "sp_trade_documents_meta_update",
+        "sp_trade_documents_meta_delete",
+        "sp_investor_type_create",
+        "sp_investor_type_update",
+        "sp_investor_type_delete",
+        "sp_transaction_create",
+    ])
+
+    # Read-your-writes scopes, SP -> (family, index of its key param or None). After a write only reads of the same
+    # family and key go to the primary (writes keyed None: the whole family), other reads stay on the replicas. A
+    # posted transaction sends reads of its trade (sp_trade_list_page filtered by trade_id) to the primary, not the
+    # unfiltered trade list. Write SPs missing here send every read to the primary for the window.
+    CONSISTENCY_SCOPES = {
+        "sp_reg_rule_review_update": ("app_rules", 1),
+        "sp_reg_review_lookup_AppId": ("app_rules", 0),
+        "sp_reg_review_lookup_RuleId": ("app_rules", 0),
+        "sp_trade_documents_meta_create": ("trade_documents_meta", None),
+        "sp_trade_documents_meta_update": ("trade_documents_meta", None),
+        "sp_trade_documents_meta_delete": ("trade_documents_meta", None),
+        "sp_trade_documents_meta_list": ("trade_documents_meta", None),
+        "sp_investor_type_create": ("investor_type", None),
+        "sp_investor_type_update": ("investor_type", None),
+        "sp_investor_type_delete": ("investor_type", None),
+        "sp_investor_type_list": ("investor_type", None),
+        "sp_transaction_create": ("trades", 2),
+        "sp_trade_list_page": ("trades", 2),
+        "sp_trade_list_all": ("trades", None),
+    }
+
+    # Reads that must see the latest commit of any worker, always run on the primary
+    PRIMARY_READ_SPS = frozenset([
+        "sp_transaction_lookup_idempotency",
+    ])
+
+    # Reference-data SPs served from the in-process cache, TTL in seconds
+    CACHE_TTLS = {
+        "sp_get_all_transaction_types": 600,
+        "sp_trade_issuers_list": 300,
+        "sp_investor_type_list": 300,
+        "sp_stxstage_forms_lookup": 300,
+        "sp_lookup_doctypes_name": 600,
+        "sp_lookup_doctypes_id": 600,
+        "sp_trade_documents_meta_list": 120,
+    }
+
+    # Large result SPs whose records are returned as a RowSet (row tuples + shared columns) instead of a dict per row
+    COMPACT_SPS = frozenset([
+        "sp_trade_list_all",
+        "sp_stxstage_responses_lookup",
+        "sp_stxstage_app_docs_uploads",
+    ])
+
+    # Statement timeouts in seconds for SPs that legitimately run longer than SP_TIMEOUT_DEFAULT, SP_TIMEOUTS overrides
+    SP_TIMEOUTS = {
+        "sp_trade_list_all": 120,
+        "sp_trade_documents_meta_list": 60,
+    }
+
+    # Errors meaning a connection could not be had or was lost, reads retry these once on the primary
+    CONNECTION_ERRORS = (PoolTimeoutError, mysql.connector.errors.OperationalError,
+                         mysql.connector.errors.InterfaceError)
+
+    # Errors meaning the DB is unreachable or too slow, these count towards opening the circuit breaker. A statement
+    # timeout is not retried elsewhere, the same query would run into it again.
+    BREAKER_ERRORS = CONNECTION_ERRORS + (QueryTimeoutError,)
+
+    # Errors a DB call is answered with as an error envelope (see `_db_error`) instead of raising
+    DB_ERRORS = (CircuitOpenError, QueryTimeoutError, PoolTimeoutError, mysql.connector.Error)
+
+    # Error codes after which a cached SP result is served stale rather than failing the request
+    STALE_ERROR_CODES = frozenset(["DB_UNAVAILABLE", "SP_TIMEOUT", "POOL_TIMEOUT"])
+
+    # Writer SP -> cached SPs whose results it makes stale
+    CACHE_INVALIDATES = {
+        "sp_investor_type_create": ("sp_investor_type_list",),
+        "sp_investor_type_update": ("sp_investor_type_list",),
+        "sp_investor_type_delete": ("sp_investor_type_list",),
+        "sp_trade_documents_meta_create": ("sp_trade_documents_meta_list",),
+        "sp_trade_documents_meta_update": ("sp_trade_documents_meta_list",),
+        "sp_trade_documents_meta_delete": ("sp_trade_documents_meta_list",),
+    }
+
+    # Reference tables warmed before a worker takes traffic and shared through the snapshot, SP -> rec_type_key.
+    # Doc types are looked up per name/id and have no list SP, they are cached on first lookup instead.
+    REFERENCE_SPS = {
+        "sp_get_all_transaction_types": "transaction_type",
+        "sp_trade_issuers_list": "ISSUERS_LIST",
+        "sp_investor_type_list": "INVESTOR_TYPE_LIST",
+        "sp_stxstage_forms_lookup": "STAX_STAGE_FORMS",
+    }
+
+    # Application bundle section -> per-app_id lookup method
+    APPLICATION_SECTIONS = {
+        "client": "lookup_client_by_id",
+        "sponsor": "lookup_sponsor_by_id",
+        "response": "lookup_response_by_id",
+        "rep_join": "lookup_rep_join_by_id",
+        "doc_uploads": "app_doc_uploads_by_id",
+        "rules": "lookup_app_rules",
+    }
+
+    # SP parameter order for trade document meta / investor type writers
+    TRADE_DOC_META_KEYS = ['td_id', 'issuer_id', 'investor_type', 'document_type_id', 'optional', 'email_address',
+                           'notes', 'created_by']
+    INVESTOR_TYPE_KEYS = ['investor_id', 'name', 'description', 'created_by']
+    TRANSACTION_KEYS = ['idempotency_key', 'trans_acc_no', 'trade_id', 'posting_date', 'trans_description',
+                        'withdrawal_deposit', 'trans_type_id', 'amount', 'created_by']
+
+    # Id column of sp_get_all_transaction_types rows
+    TRANSACTION_TYPE_ID_COLUMN = "trans_type_id"
+
+    # Rows serialized to estimate the bytes a `fields` projection saved on a sampled call
+    PROJECTION_SAMPLE_ROWS = 50
+
+    # Keyset column of sp_trade_list_page rows
+    TRADE_KEY_COLUMN = "trade_id"
+
+    # Rule id column of sp_reg_review_lookup_AppId / sp_reg_review_lookup_RuleId rows
+    APP_RULE_KEY_COLUMN = "ruleId"
+
+    # Name column of sp_lookup_doctypes_id rows
+    DOC_TYPE_NAME_COLUMN = "name"
+
+    def __init__(self, breaker: CircuitBreaker = None):
         super().__init__()
+        # Pooled connections are checked out per SP call; set DB_POOL_ENABLED=false to fall back to DatabaseHandler
+        self.pool = ConnectionPool.from_env() if os.getenv("DB_POOL_ENABLED", "true").lower() == "true" else None
+        # Reads may be served by DATABASE_REPLICA_URLS, writes always use self.pool (the primary)
+        self.router = ReplicaRouter.from_env(self.pool) if self.pool is not None else None
+        self.cache = TTLCache(max_entries=int(os.getenv("SP_CACHE_MAX_ENTRIES", "1024"))) \
+            if os.getenv("SP_CACHE_ENABLED", "true").lower() == "true" else None
+        # Results of recently posted idempotency keys, so client retries are answered without a DB call.
+        # sp_transaction_create also rejects duplicate keys, which covers other workers and restarts.
+        self.posted_transactions = TTLCache(max_entries=int(os.getenv("IDEMPOTENCY_MAX_KEYS", "100000")))
+        self.idempotency_ttl = float(os.getenv("IDEMPOTENCY_TTL", "86400"))
+        self._transaction_type_ids = (None, frozenset())
+        # rec_type_key -> column names last returned by its SP, used to validate `fields` before querying
+        self.known_columns = {}
+        self.projection_sample_every = int(os.getenv("FIELDS_SAVINGS_SAMPLE_EVERY", "20"))
+        # rec_type_key -> projected calls, so each endpoint is sampled every Nth call of its own
+        self._projection_calls = {}
+        self.sp_timeout_default = float(os.getenv("SP_TIMEOUT_DEFAULT", "30"))
+        self.sp_timeouts = dict(self.SP_TIMEOUTS)
+        for entry in os.getenv("SP_TIMEOUTS", "").split(","):
+            if "=" in entry:
+                sp, seconds = entry.split("=", 1)
+                self.sp_timeouts[sp.strip()] = float(seconds)
+        # Passed in by the app, which sheds load on it before the retriever exists
+        self.breaker = breaker or CircuitBreaker.from_env()
+        # (issuer_id, investor_type) -> document types, rebuilt from the meta list once older than the max age and
+        # updated in place by trade document meta writes made through this retriever
+        self.required_docs = RequiredDocsIndex()
+        self.required_docs_max_age = float(os.getenv("REQUIRED_DOCS_MAX_AGE", "120"))
+        # Trade counts and amount sums per issuer / transaction type / posting date / direction, rebuilt in the
+        # background by the app on a schedule and when older than the max age, posted transactions are added on top
+        self.trade_aggregates = TradeAggregates()
+        self.trade_aggregates_max_age = float(os.getenv("TRADE_AGGREGATES_MAX_AGE", "3600"))
+        self._trade_aggregates_rebuild = threading.Lock()
+        # Rule status changes pushed to /app_rules/changes subscribers
+        self.rule_changes = RuleChangeFeed(key_column=self.APP_RULE_KEY_COLUMN,
+                                           queue_size=int(os.getenv("APP_RULES_FEED_QUEUE_SIZE", "256")))
+
+    def sp_timeout(self, sp: str) -> float:
+        return self.sp_timeouts.get(sp, self.sp_timeout_default)
+
+    def execute_sp(self, sp: str, params=None):
+        """Run a stored procedure on a pooled connection, return (column names, row tuples) of its first result set.
+
+        Reads go to a replica when configured and are retried once on the primary if no connection to the replica
+        could be had or it was lost.
+        Raises CircuitOpenError without touching the DB while the breaker is open, QueryTimeoutError when the
+        statement ran past its `sp_timeout`.
+        """
+        self.breaker.allow()
+        read = sp not in self.WRITE_SPS
+        scope = self._consistency_scope(sp, params)
+        pool = self.router.pool_for(read and sp not in self.PRIMARY_READ_SPS, scope)
+        timeout = self.sp_timeout(sp)
+        try:
+            try:
+                result = self._execute_sp_on(pool, sp, params, timeout)
+            except self.CONNECTION_ERRORS as e:
+                if pool is self.pool:
+                    raise
+                self.router.mark_down(pool, e)
+                result = self._execute_sp_on(self.pool, sp, params, timeout)
+        except self.BREAKER_ERRORS as e:
+            self.breaker.record_failure(e)
+            raise
+        except BaseException:
+            # the DB answered (e.g. an SP-level error), that is not a reason to open the breaker
+            self.breaker.record_success()
+            raise
+        finally:
+            if not read:
+                self.router.note_write(scope)
+        self.breaker.record_success()
+        return result
+
+    def _consistency_scope(self, sp: str, params=None):
+        """Read-your-writes scope of an SP call, (family, key) from CONSISTENCY_SCOPES, None when it has none."""
+        scope = self.CONSISTENCY_SCOPES.get(sp)
+        if scope is None:
+            return None
+        family, key_index = scope
+        key = params[key_index] if key_index is not None and params and len(params) > key_index else None
+        return family, key
+
+    @staticmethod
+    def _execute_sp_on(pool: ConnectionPool, sp: str, params=None, timeout: float = None):
+        conn = pool.checkout()
+        deadline = pool.deadline(conn, timeout) if timeout else None
+        broken = False
+        cursor = conn.cursor()
+        start = time.perf_counter()
+        try:
+            cursor.callproc(sp, params or [])
+            columns, rows = [], []
+            for result in cursor.stored_results():
+                if result.description:
+                    columns = [column[0] for column in result.description]
+                    rows = result.fetchall()
+                    break
+            conn.commit()
+            metrics.observe_sp(sp, time.perf_counter() - start, len(rows))
+            return columns, rows
+        except Exception as e:
+            metrics.observe_sp(sp, time.perf_counter() - start, 0, status="error")
+            broken = isinstance(e, (mysql.connector.errors.OperationalError, mysql.connector.errors.InterfaceError))
+            if deadline is not None and deadline.fired:
+                raise QueryTimeoutError(f"{sp} exceeded its {timeout}s timeout and was killed") from e
+            try:
+                conn.rollback()
+            except Exception:
+                broken = True
+            raise
+        finally:
+            try:
+                cursor.close()
+            except Exception:
+                broken = True
+            # a killed statement's connection may still carry the KILL, never hand it out again
+            if deadline is not None and pool.finish_deadline(deadline):
+                broken = True
+            pool.checkin(conn, broken=broken)
+
+    def stream_sp(self, sp: str, params=None, batch_size: int = 1000):
+        """Send the CALL on an unbuffered cursor, return (column names, iterator of row tuple batches).
+
+        Checkout and SP errors are raised here, before any row is consumed; columns are None when the SP returned no
+        result set. The connection stays checked out until the batches are exhausted or closed. It is discarded rather
+        than returned to the pool when the consumer stops early (e.g. client disconnect) and results are left unread.
+        """
+        self.breaker.allow()
+        params = list(params or [])
+        pool = self.router.pool_for(read=True, scope=self._consistency_scope(sp, params))
+        try:
+            try:
+                conn = pool.checkout()
+            except self.CONNECTION_ERRORS as e:
+                if pool is self.pool:
+                    raise
+                self.router.mark_down(pool, e)
+                pool = self.pool
+                conn = pool.checkout()
+            batches = self._stream_batches(pool, conn, sp, params, batch_size)
+            # runs up to the first result set, a started generator always releases the connection when closed
+            columns = next(batches)
+        except self.BREAKER_ERRORS as e:
+            self.breaker.record_failure(e)
+            raise
+        except BaseException:
+            self.breaker.record_success()
+            raise
+        # the DB answered, a connection lost while the rows are read is recorded by the generator
+        self.breaker.record_success()
+        return columns, batches
+
+    def _stream_batches(self, pool: ConnectionPool, conn, sp: str, params: list, batch_size: int):
+        completed = False
+        cursor = None
+        try:
+            cursor = conn.cursor(buffered=False)
+            placeholders = ", ".join(["%s"] * len(params))
+            results = cursor.execute(f"CALL {sp}({placeholders})", params, multi=True)
+            first = next((result for result in results if result.with_rows), None)
+            yield [column[0] for column in first.description] if first is not None else None
+            try:
+                if first is not None:
+                    while True:
+                        rows = first.fetchmany(batch_size)
+                        if not rows:
+                            break
+                        yield rows
+                    for result in results:
+                        if result.with_rows:
+                            result.fetchall()
+                conn.commit()
+            except self.BREAKER_ERRORS as e:
+                self.breaker.record_failure(e)
+                raise
+            completed = True
+        finally:
+            try:
+                if cursor is not None:
+                    cursor.close()
+            except Exception:
+                completed = False
+            pool.checkin(conn, broken=not completed)
+
+    def open_export(self, sp: str, params=None, batch_size: int = 1000) -> dict:
+        """`stream_sp` for /export: the stream under "columns" / "batches", or the error envelope `_call_sp` would
+        return, so a DB that is down or saturated is reported before the response starts."""
+        if self.pool is None:
+            return {"status": "error", "message": "Export requires the DB connection pool (DB_POOL_ENABLED=true)"}
+        try:
+            columns, batches = self.stream_sp(sp, params=params, batch_size=batch_size)
+        except self.DB_ERRORS as e:
+            return self._db_error(sp, e)
+        return {"status": "success", "columns": columns or [], "batches": batches}
+
+    def execute_sp_batch(self, sp: str, param_rows: list, atomic: bool = True, chunk_size: int = 200) -> list:
+        """Run `sp` once per params row in a single transaction, sending up to `chunk_size` CALLs per round trip.
+
+        Returns one {"status", "message"} entry per row. With `atomic` the first failing row rolls back the whole
+        batch; otherwise each row runs behind a savepoint, failed rows are rolled back alone and the rest commit.
+        A lost connection fails the whole call and counts towards the circuit breaker, like in `execute_sp`. When the
+        batch could not run at all (no pool, breaker open, DB unreachable) every row carries the same error envelope.
+        """
+        if self.pool is None:
+            return [{"status": "error", "message": "Bulk writes require the DB connection pool (DB_POOL_ENABLED=true)"}
+                    for _ in param_rows]
+        try:
+            self.breaker.allow()
+            try:
+                results = self._execute_sp_batch(sp, param_rows, atomic, chunk_size)
+            except self.BREAKER_ERRORS as e:
+                self.breaker.record_failure(e)
+                raise
+            except BaseException:
+                self.breaker.record_success()
+                raise
+        except (CircuitOpenError,) + self.BREAKER_ERRORS as e:
+            error = self._db_error(f"{sp}[batch]", e)
+            return [dict(error) for _ in param_rows]
+        self.breaker.record_success()
+        return results
+
+    def _execute_sp_batch(self, sp: str, param_rows: list, atomic: bool, chunk_size: int) -> list:
+        results = [None] * len(param_rows)
+        self.router.note_write(*{self._consistency_scope(sp, params) for params in param_rows})
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            start_time = time.perf_counter()
+            try:
+                conn.start_transaction()
+                start = 0
+                while start < len(param_rows):
+                    chunk = param_rows[start:start + chunk_size]
+                    done, error = self._run_call_chunk(cursor, sp, chunk, results, start, savepoints=not atomic)
+                    if error is None:
+                        start += len(chunk)
+                        continue
+
+                    failed = start + done
+                    logging.error(f"{sp} batch failed at row {failed}: {error}")
+                    results[failed] = {"status": "error", "message": str(error),
+                                       "error_code": "DUPLICATE_KEY" if self._is_duplicate(error) else "DB_ERR"}
+                    if atomic:
+                        conn.rollback()
+                        return [result if index == failed else
+                                {"status": "error", "message": f"Rolled back, batch failed at row {failed}"}
+                                for index, result in enumerate(results)]
+                    cursor.execute(f"ROLLBACK TO SAVEPOINT bulk_row_{done}")
+                    start = failed + 1
+                conn.commit()
+                metrics.observe_sp(f"{sp}[batch]", time.perf_counter() - start_time, 0)
+            except Exception:
+                try:
+                    conn.rollback()
+                except Exception as e:
+                    logging.error(f"{sp} batch rollback failed: {e}")
+                raise
+            finally:
+                cursor.close()
+        self._invalidate_after_write(sp)
+        return results
+
+    @staticmethod
+    def _run_call_chunk(cursor, sp: str, chunk: list, results: list, offset: int, savepoints: bool):
+        """Send a chunk of CALLs as one multi-statement and fill `results` from offset.
+
+        Each CALL ends with one status (row-less) result, each SAVEPOINT is exactly one status result, which is how
+        results are mapped back to rows. Returns (rows completed, error or None).
+        """
+        placeholders = ", ".join(["%s"] * len(chunk[0]))
+        statements, flat_params = [], []
+        for index, params in enumerate(chunk):
+            if savepoints:
+                statements.append(f"SAVEPOINT bulk_row_{index}")
+            statements.append(f"CALL {sp}({placeholders})")
+            flat_params.extend(params)
+
+        stride = 2 if savepoints else 1
+        statuses = 0
+        messages = {}
+        try:
+            for result in cursor.execute("; ".join(statements), flat_params, multi=True):
+                if result.with_rows:
+                    rows = result.fetchall()
+                    if rows and rows[0]:
+                        messages[statuses // stride] = rows[0][0]
+                    continue
+                statuses += 1
+                if statuses % stride == 0:
+                    row = statuses // stride - 1
+                    results[offset + row] = {"status": "success", "message": messages.get(row, "message")}
+        except (mysql.connector.errors.OperationalError, mysql.connector.errors.InterfaceError):
+            # the connection is gone, not a row level failure
+            raise
+        except mysql.connector.Error as e:
+            return statuses // stride, e
+        return len(chunk), None
+
+    @staticmethod
+    def _db_error(sp: str, e: Exception) -> dict:
+        """Error envelope for a DB call that raised one of DB_ERRORS, with the error_code the routes act on."""
+        if isinstance(e, CircuitOpenError):
+            return {"status": "error", "message": str(e), "error_code": "DB_UNAVAILABLE",
+                    "retry_after": round(e.retry_after, 1)}
+        if isinstance(e, QueryTimeoutError):
+            logging.error(f"{sp}: {e}")
+            return {"status": "error", "message": str(e), "error_code": "SP_TIMEOUT"}
+        if isinstance(e, (mysql.connector.errors.OperationalError, mysql.connector.errors.InterfaceError)):
+            logging.error(f"{sp} failed, database unreachable: {e}")
+            return {"status": "error", "message": str(e), "error_code": "DB_UNAVAILABLE"}
+        if isinstance(e, PoolTimeoutError):
+            logging.error(f"{sp}: {e}")
+            return {"status": "error", "message": str(e), "error_code": "POOL_TIMEOUT"}
+        logging.error(f"{sp} failed: {e}")
+        return {"status": "error", "message": str(e),
+                "error_code": "DUPLICATE_KEY" if AppRulesDataRetriever._is_duplicate(e) else "DB_ERR"}
+
+    @staticmethod
+    def _is_duplicate(e: Exception) -> bool:
+        # a unique key rejected the row, e.g. an idempotency key posted by a concurrent request
+        return isinstance(e, mysql.connector.errors.IntegrityError) and e.errno == errorcode.ER_DUP_ENTRY
+
+    def _invalidate_after_write(self, sp: str):
+        if self.cache is not None:
+            for cached_sp in self.CACHE_INVALIDATES.get(sp, ()):
+                self.cache.invalidate(cached_sp)
+
+    @staticmethod
+    def _sp_response(columns, rows, rec_type_key=None, msg_only=False, shape="records", compact=False) -> dict:
+        # Same envelope DatabaseHandler.trades_handle_sp_call returns. shape="columnar" / "rows" replace the
+        # list of row dicts with the column names once plus per-column arrays / row tuples; `compact` keeps the
+        # records shape on the wire but holds them as a RowSet until serialized
+        if msg_only:
+            return {"status": "success", "message": rows[0][0] if rows and rows[0] else "message"}
+        if not rows:
+            return {"status": "success", "data": None}
+        if shape == "columnar":
+            return {"status": "success", "data": {rec_type_key: {
+                "columns": columns, "values": dict(zip(columns, zip(*rows))), "count": len(rows)}}}
+        if shape == "rows":
+            return {"status": "success", "data": {rec_type_key: {
+                "columns": columns, "rows": rows, "count": len(rows)}}}
+        if compact:
+            return {"status": "success", "data": {rec_type_key: RowSet(columns, rows)}}
+        return {"status": "success", "data": {rec_type_key: [dict(zip(columns, row)) for row in rows]}}
+
+    def trades_handle_sp_call(self, sp, params=None, rec_type_key=None, msg_only=False, shape="records",
+                              fields=None):
+        fields = tuple(fields) if fields else None
+        if fields and rec_type_key in self.known_columns:
+            error = self._unknown_fields(rec_type_key, self.known_columns[rec_type_key], fields)
+            if error:
+                return error
+
+        call_key = (sp, tuple(params or ()), rec_type_key, shape, fields)
+        ttl = self.CACHE_TTLS.get(sp) if self.cache is not None else None
+        if ttl:
+            found, result = self.cache.get(call_key)
+            if found:
+                return dict(result)
+
+        # identical reads in flight are collapsed by the app before they reach the DB executor
+        result = self._call_sp(sp, params=params, rec_type_key=rec_type_key, msg_only=msg_only, shape=shape,
+                               fields=fields)
+        if ttl and result.get("status") == "success":
+            self.cache.set(call_key, result, ttl)
+            result = dict(result)
+        elif ttl and result.get("error_code") in self.STALE_ERROR_CODES:
+            # DB down or too slow: an expired reference result beats an error
+            found, stale = self.cache.get(call_key, allow_stale=True)
+            if found:
+                logging.warning(f"{sp}: serving stale cached result, {result['error_code']}")
+                return dict(stale, stale=True)
+        self._invalidate_after_write(sp)
+        return result
+
+    def _call_sp(self, sp, params=None, rec_type_key=None, msg_only=False, shape="records", fields=None):
+        if self.pool is None:
+            start = time.perf_counter()
+            result = super().trades_handle_sp_call(sp=sp, params=params, rec_type_key=rec_type_key, msg_only=msg_only)
+            records = (result.get("data") or {}).get(rec_type_key, []) if isinstance(result.get("data"), dict) else []
+            metrics.observe_sp(sp, time.perf_counter() - start, len(records), status=result.get("status", "error"))
+            if (shape != "records" or fields) and records:
+                columns, rows = list(records[0]), [tuple(record.values()) for record in records]
+            else:
+                return result
+        else:
+            try:
+                columns, rows = self.execute_sp(sp, params)
+            except self.DB_ERRORS as e:
+                return self._db_error(sp, e)
+
+        if columns and rec_type_key:
+            self.known_columns[rec_type_key] = columns
+        if fields and rows:
+            error = self._unknown_fields(rec_type_key, columns, fields)
+            if error:
+                return error
+            calls = self._projection_calls[rec_type_key] = self._projection_calls.get(rec_type_key, 0) + 1
+            if self.projection_sample_every and calls % self.projection_sample_every == 0:
+                self._record_projection_savings(rec_type_key, columns, rows, fields)
+            columns, rows = self._project(columns, rows, fields)
+        return self._sp_response(columns, rows, rec_type_key=rec_type_key, msg_only=msg_only, shape=shape,
+                                 compact=sp in self.COMPACT_SPS)
+
+    @staticmethod
+    def _unknown_fields(rec_type_key, columns, fields):
+        unknown = [field for field in fields if field not in columns]
+        if not unknown:
+            return None
+        return {"status": "error", "error_code": "BAD_FIELDS",
+                "message": f"Unknown fields for {rec_type_key}: {', '.join(unknown)}. "
+                           f"Available: {', '.join(columns)}"}
+
+    @staticmethod
+    def _project(columns, rows, fields):
+        indexes = [columns.index(field) for field in fields]
+        return list(fields), [tuple(row[index] for index in indexes) for row in rows]
+
+    def _record_projection_savings(self, rec_type_key, columns, rows, fields):
+        # Estimated from up to PROJECTION_SAMPLE_ROWS evenly spaced rows scaled by the row count, so measuring a large
+        # result costs a few dozen rows of serialization rather than the whole result twice
+        sample = rows[::max(1, len(rows) // self.PROJECTION_SAMPLE_ROWS)][:self.PROJECTION_SAMPLE_ROWS]
+        full = len(dumps([dict(zip(columns, row)) for row in sample]))
+        projected_columns, projected_rows = self._project(columns, sample, fields)
+        projected = len(dumps([dict(zip(projected_columns, row)) for row in projected_rows]))
+        metrics.projection_saved.observe(round((full - projected) * len(rows) / len(sample)), rec_type_key)
+
+    def pool_stats(self) -> dict:
+        return self.pool.stats() if self.pool is not None else {}
+
+    def replica_stats(self) -> dict:
+        return self.router.stats() if self.router is not None else {}
+
+    def cache_stats(self) -> dict:
+        return self.cache.stats() if self.cache is not None else {}
+
+    def breaker_stats(self) -> dict:
+        return self.breaker.stats()
+
+    def required_docs_stats(self) -> dict:
+        return self.required_docs.stats()
+
+    def rule_changes_stats(self) -> dict:
+        return self.rule_changes.stats()
+
+    def trade_aggregates_stats(self) -> dict:
+        return self.trade_aggregates.stats()
+
+    @classmethod
+    def fetch_reference_tables(cls, pool: ConnectionPool) -> dict:
+        """(columns, rows) of every REFERENCE_SPS table, read on `pool` without a retriever instance."""
+        return {sp: cls._execute_sp_on(pool, sp) for sp in cls.REFERENCE_SPS}
+
+    def seed_reference_cache(self, tables: dict, age: float = 0.0) -> int:
+        """Cache reference tables as if their list calls had just run `age` seconds ago, return entries seeded."""
+        if self.cache is None:
+            return 0
+        seeded = 0
+        for sp, (columns, rows) in tables.items():
+            rec_type_key = self.REFERENCE_SPS.get(sp)
+            ttl = self.CACHE_TTLS.get(sp, 0) - age
+            if rec_type_key is None or ttl <= 0:
+                continue
+            self.known_columns[rec_type_key] = columns
+            self.cache.set((sp, (), rec_type_key, "records", None),
+                           self._sp_response(columns, rows, rec_type_key=rec_type_key), ttl)
+            seeded += 1
+        return seeded
+
+    def warm_up(self, snapshot=None) -> dict:
+        """Open every pool's minimum connections and load the reference tables, from `snapshot` when it is fresh."""
+        start = time.perf_counter()
+        if self.pool is None:
+            for sp, rec_type_key in self.REFERENCE_SPS.items():
+                self.trades_handle_sp_call(sp=sp, rec_type_key=rec_type_key)
+            return {"source": "database", "tables": len(self.REFERENCE_SPS),
+                    "seconds": round(time.perf_counter() - start, 3)}
+
+        for pool in self.router.pools():
+            pool.fill()
+        if self.cache is None:
+            return {"source": None, "tables": 0, "seconds": round(time.perf_counter() - start, 3)}
+        tables, age = snapshot.load() if snapshot is not None else (None, 0.0)
+        seeded = self.seed_reference_cache(tables, age) if tables else 0
+        source = "snapshot"
+        if seeded < len(self.REFERENCE_SPS):
+            tables, source = {sp: self.execute_sp(sp) for sp in self.REFERENCE_SPS}, "database"
+            seeded = self.seed_reference_cache(tables)
+        return {"source": source, "snapshot_age_s": round(age, 1) if source == "snapshot" else None,
+                "tables": seeded, "seconds": round(time.perf_counter() - start, 3)}
 
     # Retrieve specific app rules statuses
     def lookup_app_rules(self, a_app_id: int) -> dict:
         return self.trades_handle_sp_call(sp="sp_reg_review_lookup_AppId", params=[a_app_id],
                                           rec_type_key="app_rules_list")
 
+    def poll_app_rules(self, app_id: int) -> dict:
+        """Read the rules of a subscribed application and push what changed, e.g. through another worker.
+
+        Not run through the app's single-flight, an in-flight lookup may predate a write that was already pushed.
+        """
+        result = self._call_sp("sp_reg_review_lookup_AppId", params=[app_id], rec_type_key="app_rules_list")
+        self._publish_rule_changes(app_id, result, "app_rules_list", complete=True)
+        return result
+
+    def _publish_rule_changes(self, app_id, result: dict, rec_type_key: str, complete: bool = False):
+        if result.get("status") == "success" and self.rule_changes.is_subscribed(app_id):
+            self.rule_changes.publish_rows(app_id, (result.get("data") or {}).get(rec_type_key) or [],
+                                           complete=complete)
+
     # Retrieve specific rule for specific app
     def look_app_rule_by_id(self, app_id, rule_id):
         return self.trades_handle_sp_call(sp="sp_reg_review_lookup_RuleId", params=[app_id, rule_id],
@@ -29,42 +684,138 @@ class AppRulesDataRetriever(DatabaseHandler):
             app_rule_data['notes'],
             app_rule_data['user']
         ]
-        return self.trades_handle_sp_call(sp="sp_reg_rule_review_update", params=params, msg_only=True)
+        result = self.trades_handle_sp_call(sp="sp_reg_rule_review_update", params=params, msg_only=True)
+        app_id = app_rule_data['applicationId']
+        if result.get("status") == "success" and self.rule_changes.is_subscribed(app_id):
+            # one read of the written rule, on the primary, whatever the number of subscribers
+            rule = self._call_sp("sp_reg_review_lookup_RuleId", params=[app_id, app_rule_data['ruleId']],
+                                 rec_type_key="app_rule")
+            self._publish_rule_changes(app_id, rule, "app_rule")
+        return result
+
+    def bulk_update_app_rules(self, app_id: int, app_rules: list) -> dict:
+        """Apply every rule review of an application in one transaction, then return its updated rules view.
+
+        All or nothing: when a rule fails the batch is rolled back and the per-rule results are returned instead.
+        """
+        params = [[rule['id'], app_id, rule['ruleId'], rule['override'], rule['status'], rule['notes'], rule['user']]
+                  for rule in app_rules]
+        results = self.execute_sp_batch("sp_reg_rule_review_update", params, atomic=True)
+        if any(result["status"] != "success" for result in results):
+            return {"status": "error", "message": "Rule reviews rolled back", "results": results}
+
+        # read on the primary inside the read-your-writes window
+        result = self._call_sp("sp_reg_review_lookup_AppId", params=[app_id], rec_type_key="app_rules_list")
+        self._publish_rule_changes(app_id, result, "app_rules_list", complete=True)
+        return dict(result, updated=len(results))
 
     def create_trade_documents_meta(self, trade_doc_meta: dict):
-        params = [trade_doc_meta.get(key) for key in
-                  ['td_id', 'issuer_id', 'investor_type', 'document_type_id', 'optional', 'email_address', 'notes',
-                   'created_by']]
-        return self.trades_handle_sp_call(sp="sp_trade_documents_meta_create", params=params, msg_only=True)
+        params = [trade_doc_meta.get(key) for key in self.TRADE_DOC_META_KEYS]
+        result = self.trades_handle_sp_call(sp="sp_trade_documents_meta_create", params=params, msg_only=True)
+        if result.get("status") == "success":
+            self._index_trade_doc_metas([trade_doc_meta], created=True)
+        return result
 
     def update_trade_documents_meta(self, trade_doc_meta: dict):
-        params = [trade_doc_meta.get(key) for key in
-                  ['td_id', 'issuer_id', 'investor_type', 'document_type_id', 'optional', 'email_address', 'notes',
-                   'created_by']]
-        return self.trades_handle_sp_call(sp="sp_trade_documents_meta_update", params=params, msg_only=True)
+        params = [trade_doc_meta.get(key) for key in self.TRADE_DOC_META_KEYS]
+        result = self.trades_handle_sp_call(sp="sp_trade_documents_meta_update", params=params, msg_only=True)
+        if result.get("status") == "success":
+            self._index_trade_doc_metas([trade_doc_meta])
+        return result
+
+    def bulk_create_trade_documents_meta(self, trade_doc_metas: list, atomic: bool = True) -> list:
+        params = [[meta.get(key) for key in self.TRADE_DOC_META_KEYS] for meta in trade_doc_metas]
+        results = self.execute_sp_batch("sp_trade_documents_meta_create", params, atomic=atomic)
+        self._index_trade_doc_metas([meta for meta, result in zip(trade_doc_metas, results)
+                                     if result.get("status") == "success"], created=True)
+        return results
+
+    def bulk_update_trade_documents_meta(self, trade_doc_metas: list, atomic: bool = True) -> list:
+        params = [[meta.get(key) for key in self.TRADE_DOC_META_KEYS] for meta in trade_doc_metas]
+        results = self.execute_sp_batch("sp_trade_documents_meta_update", params, atomic=atomic)
+        self._index_trade_doc_metas([meta for meta, result in zip(trade_doc_metas, results)
+                                     if result.get("status") == "success"])
+        return results
 
     def delete_trade_documents_meta(self, trade_doc_meta: dict):
         params = [trade_doc_meta.get(key) for key in
                   ['td_id', 'created_by']]
-        return self.trades_handle_sp_call(sp="sp_trade_documents_meta_delete", params=params, msg_only=True)
+        result = self.trades_handle_sp_call(sp="sp_trade_documents_meta_delete", params=params, msg_only=True)
+        if result.get("status") == "success":
+            self.required_docs.remove(trade_doc_meta['td_id'])
+        return result
+
+    def _index_trade_doc_metas(self, trade_doc_metas: list, created: bool = False):
+        if not trade_doc_metas:
+            return
+        if created:
+            # the td_id a client sends is not necessarily the one sp_trade_documents_meta_create stored, upserting
+            # under it could replace another document: new rows are only known after a rebuild
+            self.required_docs.expire()
+            return
+        for meta in trade_doc_metas:
+            self.required_docs.upsert(meta)
+        self._load_doc_type_names({meta['document_type_id'] for meta in trade_doc_metas})
+
+    def required_docs_fresh(self) -> bool:
+        return self.required_docs.age <= self.required_docs_max_age
+
+    def required_documents(self, issuer_id: int, investor_type: int) -> dict:
+        """Document types required (optional: false) or optional for a trade, resolved from the in-memory index.
+
+        Only rebuilds the index, from the cached sp_trade_documents_meta_list result, when it is older than
+        `required_docs_max_age`. If that fails an existing index keeps being served.
+        """
+        if not self.required_docs_fresh():
+            result = self.list_trade_docs_meta(shape="rows")
+            if result.get("status") == "success":
+                table = (result.get("data") or {}).get("TRADE_DOCUMENTS_META") or {"columns": [], "rows": []}
+                self.required_docs.rebuild(table["columns"], table["rows"])
+                self._load_doc_type_names()
+            elif not self.required_docs.rebuilds:
+                return result
+            else:
+                logging.error(f"Failed to rebuild required documents index, serving previous: {result.get('message')}")
+        return {"status": "success", "data": self.required_docs.resolve(issuer_id, investor_type)}
+
+    def _load_doc_type_names(self, document_type_ids: set = None):
+        # doc types have no list SP, names come from the (cached) per-id lookup
+        names = {}
+        for document_type_id in self.required_docs.missing_doc_type_names(document_type_ids):
+            result = self.lookup_list_document_type_by_id(document_type_id)
+            if result.get("status") != "success":
+                continue
+            rows = (result.get("data") or {}).get("DOC_TYPE") or [{}]
+            names[document_type_id] = rows[0].get(self.DOC_TYPE_NAME_COLUMN)
+        if names:
+            self.required_docs.set_doc_type_names(names)
 
-    def list_trade_docs_meta(self) -> dict:
-        return self.trades_handle_sp_call(sp="sp_trade_documents_meta_list", rec_type_key="TRADE_DOCUMENTS_META")
+    def list_trade_docs_meta(self, shape: str = "records") -> dict:
+        return self.trades_handle_sp_call(sp="sp_trade_documents_meta_list", rec_type_key="TRADE_DOCUMENTS_META",
+                                          shape=shape)
 
     def create_investor_type(self, investor_type: dict):
-        params = [investor_type.get(key) for key in ['investor_id', 'name', 'description', 'created_by']]
+        params = [investor_type.get(key) for key in self.INVESTOR_TYPE_KEYS]
         return self.trades_handle_sp_call(sp="sp_investor_type_create", params=params, msg_only=True)
 
     def update_investor_type(self, investor_type: dict):
-        params = [investor_type.get(key) for key in ['investor_id', 'name', 'description', 'created_by']]
+        params = [investor_type.get(key) for key in self.INVESTOR_TYPE_KEYS]
         return self.trades_handle_sp_call(sp="sp_investor_type_update", params=params, msg_only=True)
 
+    def bulk_create_investor_type(self, investor_types: list, atomic: bool = True) -> list:
+        params = [[investor_type.get(key) for key in self.INVESTOR_TYPE_KEYS] for investor_type in investor_types]
+        return self.execute_sp_batch("sp_investor_type_create", params, atomic=atomic)
+
+    def bulk_update_investor_type(self, investor_types: list, atomic: bool = True) -> list:
+        params = [[investor_type.get(key) for key in self.INVESTOR_TYPE_KEYS] for investor_type in investor_types]
+        return self.execute_sp_batch("sp_investor_type_update", params, atomic=atomic)
+
     def delete_investor_type(self, investor_type: dict):
         params = [investor_type.get(key) for key in ['investor_id', 'created_by']]
         return self.trades_handle_sp_call(sp="sp_investor_type_delete", params=params, msg_only=True)
 
-    def list_all_investor_type(self) -> dict:
-        return self.trades_handle_sp_call(sp="sp_investor_type_list", rec_type_key='INVESTOR_TYPE_LIST')
+    def list_all_investor_type(self, shape: str = "records") -> dict:
+        return self.trades_handle_sp_call(sp="sp_investor_type_list", rec_type_key='INVESTOR_TYPE_LIST', shape=shape)
 
     def list_issuers_list(self) -> dict:
         return self.trades_handle_sp_call(sp="sp_trade_issuers_list", rec_type_key="ISSUERS_LIST")
@@ -80,23 +831,169 @@ class AppRulesDataRetriever(DatabaseHandler):
     def get_all_transaction_type(self) -> dict:
         return self.trades_handle_sp_call(sp="sp_get_all_transaction_types", rec_type_key="transaction_type")
 
-    def get_all_trade_list(self) -> dict:
-        return self.trades_handle_sp_call(sp="sp_trade_list_all", rec_type_key="TRADE_LIST")
+    def transaction_type_ids(self) -> frozenset:
+        """Valid trans_type_id values, built from the cached sp_get_all_transaction_types result."""
+        result = self.get_all_transaction_type()
+        if result.get("status") != "success":
+            raise self.DatabaseLookupError(f"Failed to load transaction types: {result.get('message')}")
+
+        rows = result.get("data")
+        source, ids = self._transaction_type_ids
+        if rows is not source:
+            ids = frozenset(row[self.TRANSACTION_TYPE_ID_COLUMN] for row in (rows or {}).get("transaction_type", []))
+            self._transaction_type_ids = (rows, ids)
+        return ids
+
+    def create_transaction(self, transaction: dict) -> dict:
+        key = transaction.get('idempotency_key')
+        if key:
+            found, result = self.posted_transactions.get(("idempotency", key))
+            if found:
+                return dict(result, replayed=True)
+
+        params = [transaction.get(column) for column in self.TRANSACTION_KEYS]
+        posted_at = time.monotonic()
+        result = self.trades_handle_sp_call(sp="sp_transaction_create", params=params, msg_only=True)
+        if result.get("status") == "success":
+            self.trade_aggregates.add_transactions([transaction], posted_at)
+            if key:
+                self.posted_transactions.set(("idempotency", key), result, self.idempotency_ttl)
+        elif key and result.get("error_code") == "DUPLICATE_KEY":
+            # a concurrent retry (this or another worker) posted the key first, answer with what it stored
+            return self._replay_posted_transaction(key) or result
+        return result
+
+    def _replay_posted_transaction(self, key: str):
+        """Result for a transaction whose idempotency key is already posted, read back from the primary, or None when
+        the duplicate was not on the idempotency key."""
+        found = self._call_sp("sp_transaction_lookup_idempotency", params=[key], rec_type_key="TRANSACTION")
+        if found.get("status") != "success" or not (found.get("data") or {}).get("TRANSACTION"):
+            return None
+        result = {"status": "success", "message": "message", "data": found["data"]}
+        self.posted_transactions.set(("idempotency", key), result, self.idempotency_ttl)
+        return dict(result, replayed=True)
+
+    def bulk_create_transactions(self, transactions: list, atomic: bool = True) -> list:
+        results = [None] * len(transactions)
+        pending = []
+        for index, transaction in enumerate(transactions):
+            key = transaction.get('idempotency_key')
+            found, result = self.posted_transactions.get(("idempotency", key)) if key else (False, None)
+            if found:
+                results[index] = dict(result, replayed=True)
+            else:
+                pending.append(index)
+
+        if pending:
+            params = [[transactions[index].get(column) for column in self.TRANSACTION_KEYS] for index in pending]
+            posted_at = time.monotonic()
+            posted = []
+            for index, result in zip(pending, self.execute_sp_batch("sp_transaction_create", params, atomic=atomic)):
+                key = transactions[index].get('idempotency_key')
+                if key and result.get("error_code") == "DUPLICATE_KEY":
+                    # posted by a concurrent retry, already counted by whoever posted it
+                    result = self._replay_posted_transaction(key) or result
+                elif result.get("status") == "success":
+                    posted.append(transactions[index])
+                    if key:
+                        self.posted_transactions.set(("idempotency", key), result, self.idempotency_ttl)
+                results[index] = result
+            self.trade_aggregates.add_transactions(posted, posted_at)
+        return results
+
+    def rebuild_trade_aggregates(self) -> dict:
+        """Recompute the trade aggregates from the whole trade list, streamed batch by batch when pooled.
+
+        Returns None right away when a rebuild is already running, its result will be served once it completes.
+        """
+        if not self._trade_aggregates_rebuild.acquire(blocking=False):
+            return None
+        try:
+            if self.pool is not None:
+                columns, batches = self.stream_sp("sp_trade_list_all", batch_size=10000)
+                try:
+                    self.trade_aggregates.rebuild(itertools.chain([columns], batches))
+                finally:
+                    batches.close()
+            else:
+                result = self.get_all_trade_list(shape="rows")
+                if result.get("status") != "success":
+                    raise self.DatabaseLookupError(f"Failed to load trades: {result.get('message')}")
+                table = (result.get("data") or {}).get("TRADE_LIST") or {"columns": [], "rows": []}
+                self.trade_aggregates.rebuild(iter([table["columns"], table["rows"]]))
+        finally:
+            self._trade_aggregates_rebuild.release()
+        stats = self.trade_aggregates.stats()
+        logging.info(f"Rebuilt trade aggregates in {stats['rebuild_seconds']}s")
+        return stats
+
+    def trade_aggregates_fresh(self) -> bool:
+        return self.trade_aggregates.age <= self.trade_aggregates_max_age
+
+    def trade_aggregates_rebuilding(self) -> bool:
+        return self._trade_aggregates_rebuild.locked()
+
+    def get_trade_aggregates(self, group_by: str) -> dict:
+        """Trade counts and amount sums grouped by one of TradeAggregates.DIMENSIONS, from the precomputed summaries.
+
+        Never waits for a rebuild, which the app runs in the background: summaries older than
+        `trade_aggregates_max_age` are still served, marked `"stale": true`, and `error_code: BUILDING` is returned
+        until the first rebuild completes, or `BUILD_FAILED` with the reason while the last attempt failed.
+        """
+        if not self.trade_aggregates.rebuilds:
+            last_error = self.trade_aggregates.last_error
+            if last_error is not None and not self.trade_aggregates_rebuilding():
+                return {"status": "error", "message": f"Trade aggregates could not be built: {last_error}",
+                        "error_code": "BUILD_FAILED"}
+            return {"status": "error", "message": "Trade aggregates are being built, retry later",
+                    "error_code": "BUILDING"}
+        result = {"status": "success", "data": self.trade_aggregates.resolve(group_by)}
+        if not self.trade_aggregates_fresh():
+            result["stale"] = True
+        return result
+
+    def get_all_trade_list(self, shape: str = "records", fields: list = None) -> dict:
+        return self.trades_handle_sp_call(sp="sp_trade_list_all", rec_type_key="TRADE_LIST", shape=shape,
+                                          fields=fields)
+
+    # Keyset page of trades ordered by trade id, filters are applied by the SP
+    def get_trade_list_page(self, limit: int, after_id: int = None, trade_id: int = None, date_from=None,
+                            date_to=None, issuer_id: int = None, trans_type_id: int = None,
+                            fields: list = None, shape: str = "records") -> dict:
+        # Ask for one extra row to know whether another page exists
+        params = [after_id, limit + 1, trade_id, date_from, date_to, issuer_id, trans_type_id]
+        if fields and self.TRADE_KEY_COLUMN not in fields:
+            # the cursor is read from the last row
+            fields = [self.TRADE_KEY_COLUMN] + list(fields)
+        # read as row tuples, the page is cut and its cursor read before it is shaped
+        result = self.trades_handle_sp_call(sp="sp_trade_list_page", params=params, rec_type_key="TRADE_LIST",
+                                            shape="rows", fields=fields)
+        if result.get("status") != "success":
+            return result
+
+        table = (result.get("data") or {}).get("TRADE_LIST") or {"columns": [], "rows": []}
+        columns, rows = table["columns"], table["rows"]
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        page = self._sp_response(columns, rows, rec_type_key="TRADE_LIST", shape=shape)
+        return dict(page, limit=limit,
+                    next_cursor=rows[-1][columns.index(self.TRADE_KEY_COLUMN)] if has_more else None)
 
     def app_doc_uploads_by_id(self, app_id) -> dict:
         return self.trades_handle_sp_call(sp="sp_stxstage_app_docs_uploads", params=[app_id],
                                           rec_type_key="APP_DOC_UPLOADS")
 
-    def lookup_client_by_id(self, app_id) -> dict:
+    def lookup_client_by_id(self, app_id, fields: list = None) -> dict:
         return self.trades_handle_sp_call(sp="sp_stxstage_client_lookup", params=[app_id],
-                                          rec_type_key="STAX_STAGE_CLIENT")
+                                          rec_type_key="STAX_STAGE_CLIENT", fields=fields)
 
-    def lookup_forms(self) -> dict:
-        return self.trades_handle_sp_call(sp="sp_stxstage_forms_lookup", rec_type_key="STAX_STAGE_FORMS")
+    def lookup_forms(self, fields: list = None) -> dict:
+        return self.trades_handle_sp_call(sp="sp_stxstage_forms_lookup", rec_type_key="STAX_STAGE_FORMS",
+                                          fields=fields)
 
-    def lookup_response_by_id(self, app_id) -> dict:
+    def lookup_response_by_id(self, app_id, fields: list = None) -> dict:
         return self.trades_handle_sp_call(sp="sp_stxstage_responses_lookup", params=[app_id],
-                                          rec_type_key="STAX_STAGE_RESPONSES")
+                                          rec_type_key="STAX_STAGE_RESPONSES", fields=fields)
 
     def lookup_sponsor_by_id(self, app_id) -> dict:
         return self.trades_handle_sp_call(sp="sp_stxstage_sponsor_lookup", params=[app_id],
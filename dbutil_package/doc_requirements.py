@@ -0,0 +1,137 @@
+import threading
+import time
+
+# trade_documents_meta.optional value of an optional document, OptionalEnum.true in main.py
+OPTIONAL_VALUE = 0
+
+
+class RequiredDocsIndex:
+    """In-memory index of trade document meta keyed by (issuer_id, investor_type).
+
+    Built from the full sp_trade_documents_meta_list result, then kept current one td_id at a time as meta rows are
+    created, updated or deleted through this process. The resolved document list for a key is built once and reused
+    until a write touches that key, so repeated lookups return the same object (which also lets the response
+    ETag/body memo in fast_json skip serialization).
+    """
+
+    REC_TYPE_KEY = "REQUIRED_DOCS"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # td_id -> (issuer_id, investor_type, document_type_id, optional)
+        self._meta = {}
+        # (issuer_id, investor_type) -> set of td_id
+        self._keys = {}
+        # (issuer_id, investor_type) -> resolved data dict, dropped when the key changes
+        self._resolved = {}
+        self.doc_type_names = {}
+        self.built_at = None
+        self.rebuilds = 0
+        self.incremental_updates = 0
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self.built_at if self.built_at is not None else float("inf")
+
+    def rebuild(self, columns: list, rows: list):
+        positions = [columns.index(column) for column in
+                     ("td_id", "issuer_id", "investor_type", "document_type_id", "optional")] if rows else []
+        meta, keys = {}, {}
+        for row in rows:
+            td_id, issuer_id, investor_type, document_type_id, optional = (row[index] for index in positions)
+            meta[td_id] = (issuer_id, investor_type, document_type_id, optional)
+            keys.setdefault((issuer_id, investor_type), set()).add(td_id)
+        with self._lock:
+            self._meta, self._keys, self._resolved = meta, keys, {}
+            self.built_at = time.monotonic()
+            self.rebuilds += 1
+
+    def expire(self):
+        """Force a rebuild on the next lookup, for writes whose effect on the index is not known (e.g. new td_id)."""
+        with self._lock:
+            self.built_at = None
+
+    def _remove_locked(self, td_id):
+        previous = self._meta.pop(td_id, None)
+        if previous is None:
+            return
+        key = previous[:2]
+        td_ids = self._keys.get(key)
+        if td_ids is not None:
+            td_ids.discard(td_id)
+            if not td_ids:
+                del self._keys[key]
+        self._resolved.pop(key, None)
+
+    def upsert(self, meta: dict):
+        """Apply a created or updated trade_documents_meta row (TRADE_DOC_META_KEYS dict)."""
+        td_id = meta["td_id"]
+        key = (meta["issuer_id"], meta["investor_type"])
+        with self._lock:
+            if self.built_at is None:
+                return
+            self._remove_locked(td_id)
+            self._meta[td_id] = key + (meta["document_type_id"], meta["optional"])
+            self._keys.setdefault(key, set()).add(td_id)
+            self._resolved.pop(key, None)
+            self.incremental_updates += 1
+
+    def remove(self, td_id):
+        with self._lock:
+            if self.built_at is None:
+                return
+            self._remove_locked(td_id)
+            self.incremental_updates += 1
+
+    def missing_doc_type_names(self, document_type_ids: set = None) -> set:
+        """Document type ids, of the whole index or of `document_type_ids`, whose name is not loaded yet."""
+        with self._lock:
+            if document_type_ids is None:
+                document_type_ids = {entry[2] for entry in self._meta.values()}
+            return set(document_type_ids) - self.doc_type_names.keys()
+
+    def resolve(self, issuer_id, investor_type):
+        """Return the envelope `data` for the key, or None when it has no documents.
+
+        A document type listed more than once for the key is reported once, required if any entry requires it.
+        """
+        key = (issuer_id, investor_type)
+        with self._lock:
+            data = self._resolved.get(key)
+            if data is not None or key not in self._keys:
+                return data
+
+            documents = {}
+            for td_id in sorted(self._keys[key]):
+                document_type_id, optional = self._meta[td_id][2:]
+                required = optional != OPTIONAL_VALUE
+                document = documents.get(document_type_id)
+                if document is None:
+                    documents[document_type_id] = {
+                        "td_id": td_id,
+                        "document_type_id": document_type_id,
+                        "document_type_name": self.doc_type_names.get(document_type_id),
+                        "optional": not required,
+                    }
+                elif required:
+                    document.update(td_id=td_id, optional=False)
+            data = {self.REC_TYPE_KEY: [documents[document_type_id] for document_type_id in sorted(documents)]}
+            self._resolved[key] = data
+            return data
+
+    def set_doc_type_names(self, names: dict):
+        with self._lock:
+            self.doc_type_names.update(names)
+            self._resolved = {}
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "meta_rows": len(self._meta),
+                "keys": len(self._keys),
+                "resolved_keys": len(self._resolved),
+                "doc_type_names": len(self.doc_type_names),
+                "age_s": round(self.age, 1) if self.built_at is not None else None,
+                "rebuilds": self.rebuilds,
+                "incremental_updates": self.incremental_updates,
+            }
@@ -0,0 +1,162 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from starlette.responses import JSONResponse, Response
+
+from dbutil_package.db_rows import RowSet
+
+try:
+    import orjson
+except ImportError:  # orjson is optional, fall back to the stdlib encoder
+    orjson = None
+
+
+def _default(obj):
+    # Same conversions as FastAPI's jsonable_encoder for the types SP rows carry
+    if isinstance(obj, Decimal):
+        return int(obj) if obj.as_tuple().exponent >= 0 else float(obj)
+    if isinstance(obj, bytes):
+        return obj.decode()
+    if isinstance(obj, timedelta):
+        return obj.total_seconds()
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if orjson is None and isinstance(obj, (datetime, date, time)):
+        return obj.isoformat()
+    raise TypeError(f"Type {type(obj).__name__} is not JSON serializable")
+
+
+def _encode(content, default=_default) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, default=default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, default=default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+# Records of a RowSet turned into dicts at a time while serializing
+ROWSET_CHUNK_ROWS = 10000
+# Encoded in place of each RowSet, then replaced by its records. Both encoders escape NUL, so the marker can only
+# collide with a string value that is exactly this marker.
+_ROWSET_MARKER = "\x00rowset\x00"
+_ROWSET_MARKER_JSON = _encode(_ROWSET_MARKER)
+
+
+def _splice_rowsets(body: bytes, rowsets: list) -> bytearray:
+    # one growing buffer: the records are encoded chunk by chunk straight into the body, so a large result never
+    # exists as dicts, as chunk parts and as the joined document at the same time
+    pieces = body.split(_ROWSET_MARKER_JSON)
+    out = bytearray(pieces[0])
+    for rows, piece in zip(rowsets, pieces[1:]):
+        out += b"["
+        for start in range(0, len(rows), ROWSET_CHUNK_ROWS):
+            if start:
+                out += b","
+            out += memoryview(_encode(rows[start:start + ROWSET_CHUNK_ROWS].to_records()))[1:-1]
+        out += b"]"
+        out += piece
+    return out
+
+
+def dumps(content) -> bytes:
+    """Serialize retriever results; datetime/date are handled natively by orjson, Decimal/bytes by `_default`.
+
+    Content holding a RowSet comes back as a bytearray, built in one pass without a bytes copy of the whole body.
+    """
+    rowsets = []
+
+    def default(obj):
+        if isinstance(obj, RowSet):
+            rowsets.append(obj)
+            return _ROWSET_MARKER
+        return _default(obj)
+
+    body = _encode(content, default)
+    return _splice_rowsets(body, rowsets) if rowsets else body
+
+
+def loads(data):
+    """Parse JSON from bytes, a bytearray or a memoryview (e.g. over an mmap), with orjson when installed."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(bytes(data))
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON response rendered with orjson when installed.
+
+    Returning it directly from a route skips FastAPI's jsonable_encoder pass over the result.
+    """
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+class EncodedJSONResponse(Response):
+    """JSON body already serialized by `dumps` (bytes, or a bytearray for RowSet results), sent as is."""
+
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return content
+
+
+# id(result data) -> (data, rest of the envelope, etag, body). Holding `data` keeps the id valid; cached retriever
+# results and in-memory index lookups return the same data object on every hit, so their tag and body are computed
+# once per cache entry instead of once per request. Only those are memoized: a fresh result never hits and would only
+# keep its data and body alive.
+_tag_memo = OrderedDict()
+_tag_memo_lock = threading.Lock()
+TAG_MEMO_SIZE = 64
+
+
+def _tagged_body(content: dict, memoize: bool = False):
+    data = content.get("data")
+    memoize = memoize and data is not None
+    if memoize:
+        # envelope fields besides data (e.g. "stale") are part of the body too
+        envelope = {key: value for key, value in content.items() if key != "data"}
+        with _tag_memo_lock:
+            memo = _tag_memo.get(id(data))
+            if memo is not None and memo[0] is data and memo[1] == envelope:
+                _tag_memo.move_to_end(id(data))
+                return memo[2], memo[3]
+
+    body = dumps(content)
+    # weak tag: the same representation may be sent gzip/brotli encoded
+    etag = f'W/"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+    if memoize:
+        with _tag_memo_lock:
+            _tag_memo[id(data)] = (data, envelope, etag, body)
+            _tag_memo.move_to_end(id(data))
+            while len(_tag_memo) > TAG_MEMO_SIZE:
+                _tag_memo.popitem(last=False)
+    return etag, body
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag[2:]
+    return any(candidate.strip().removeprefix("W/") == opaque for candidate in if_none_match.split(","))
+
+
+def conditional_json_response(request, content: dict, cache_control: str = "no-cache",
+                              memoize: bool = False) -> Response:
+    """JSON response with an ETag from a content hash, or 304 Not Modified when the client already has it.
+
+    Only successful results are tagged, errors go out as a plain FastJSONResponse. Pass `memoize=True` for data that is
+    served again as the same object (retriever cache, in-memory indexes) to reuse its tag and body.
+    """
+    if content.get("status") != "success":
+        return FastJSONResponse(content)
+
+    etag, body = _tagged_body(content, memoize)
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return EncodedJSONResponse(body, headers=headers)
@@ -0,0 +1,34 @@
+import threading
+
+
+class LazyInstance:
+    """Module-level stand-in for an object whose construction is slow or has side effects.
+
+    The factory runs once, on `get()` (from a startup hook) or on the first attribute access, so importing the module
+    that declares it needs neither the environment nor the database. Attribute access is forwarded to the instance.
+    """
+
+    def __init__(self, factory, name: str = None):
+        self._factory = factory
+        self._name = name or getattr(factory, "__name__", "instance")
+        self._instance = None
+        self._lock = threading.Lock()
+
+    @property
+    def built(self) -> bool:
+        return self._instance is not None
+
+    def get(self):
+        instance = self._instance
+        if instance is None:
+            with self._lock:
+                if self._instance is None:
+                    self._instance = self._factory()
+                instance = self._instance
+        return instance
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
+
+    def __repr__(self):
+        return f"<LazyInstance {self._name} {'built' if self.built else 'pending'}>"
@@ -0,0 +1,210 @@
+import contextvars
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import time
+import uuid
+from datetime import datetime, timezone
+
+# Structured attributes copied into JSON records when present, pass them with `extra={...}`
+STRUCTURED_FIELDS = ("request_id", "route", "app_id", "method", "status", "sp", "duration_ms", "rows")
+
+_request_context = contextvars.ContextVar("request_context", default=None)
+
+
+class RequestContext:
+    __slots__ = ("request_id", "scope", "route_paths", "sampled")
+
+    def __init__(self, request_id: str, scope: dict, route_paths, sampled: bool):
+        self.request_id = request_id
+        self.scope = scope
+        self.route_paths = route_paths
+        self.sampled = sampled
+
+    @property
+    def route(self) -> str:
+        # the router fills scope["endpoint"] before the endpoint runs, so this is the template once routed
+        return self.route_paths().get(self.scope.get("endpoint"), self.scope.get("path"))
+
+    @property
+    def app_id(self):
+        return self.scope.get("path_params", {}).get("app_id")
+
+
+class ContextFilter(logging.Filter):
+    """Stamps records with the current request's id, route template and app_id."""
+
+    def filter(self, record):
+        context = _request_context.get()
+        if context is not None:
+            record.request_id = getattr(record, "request_id", context.request_id)
+            record.route = getattr(record, "route", context.route)
+            app_id = context.app_id
+            if app_id is not None and not hasattr(record, "app_id"):
+                record.app_id = app_id
+        return True
+
+
+class SuccessSampler(logging.Filter):
+    """Keeps `rate` of the records below WARNING, warnings and errors always pass.
+
+    Inside a request the decision is made once per request, so a sampled request keeps all of its lines.
+    """
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or self.rate >= 1:
+            return True
+        context = _request_context.get()
+        if context is not None:
+            return context.sampled
+        return random.random() < self.rate
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, message, the STRUCTURED_FIELDS present and exc."""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for field in STRUCTURED_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class AsyncQueueHandler(logging.handlers.QueueHandler):
+    """Hands records to the listener thread without blocking; drops and counts records when the queue is full."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Merge args and render the traceback here, the only work done on the caller's thread. Structured
+        # attributes survive for the JSON formatter, unlike the stock prepare() which formats the whole record.
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg, record.args, record.exc_info = record.message, None, None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def sample_rate_from_env() -> float:
+    return float(os.getenv("LOG_SUCCESS_SAMPLE_RATE", "1"))
+
+
+class QueueLogging:
+    """Moves the root handlers configured by `setup_logging()` behind a bounded queue drained by one thread."""
+
+    def __init__(self, listener: logging.handlers.QueueListener, handler: AsyncQueueHandler, sample_rate: float):
+        self.listener = listener
+        self.handler = handler
+        self.sample_rate = sample_rate
+
+    @classmethod
+    def start(cls):
+        sample_rate = sample_rate_from_env()
+        log_queue = queue.Queue(maxsize=int(os.getenv("LOG_QUEUE_SIZE", "10000")))
+
+        root = logging.getLogger()
+        targets = list(root.handlers)
+        if os.getenv("LOG_FORMAT", "json").lower() == "json":
+            for target in targets:
+                target.setFormatter(JsonFormatter())
+
+        handler = AsyncQueueHandler(log_queue)
+        handler.addFilter(SuccessSampler(sample_rate))
+        handler.addFilter(ContextFilter())
+        for target in targets:
+            root.removeHandler(target)
+        root.addHandler(handler)
+
+        listener = logging.handlers.QueueListener(log_queue, *targets, respect_handler_level=True)
+        listener.start()
+        return cls(listener, handler, sample_rate)
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self.handler.queue.qsize(),
+            "dropped": self.handler.dropped,
+            "sample_rate": self.sample_rate,
+        }
+
+    def stop(self):
+        """Flush what is queued and stop the listener thread."""
+        self.listener.stop()
+
+
+class RequestLogMiddleware:
+    """ASGI middleware binding a request id to everything logged while serving the request.
+
+    The id comes from the X-Request-ID header or is generated, and is echoed on the response. One structured
+    access record (route, method, status, duration_ms) is logged per request at INFO, so it is sampled like
+    other success-path lines; 5xx responses are logged at WARNING and always kept.
+    """
+
+    def __init__(self, app, route_paths, sample_rate: float = 1.0):
+        self.app = app
+        self.route_paths = route_paths
+        self.sample_rate = sample_rate
+        self.logger = logging.getLogger("access")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope.get("headers", ()):
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")[:128]
+                break
+        request_id = request_id or uuid.uuid4().hex
+        context = RequestContext(request_id, scope, self.route_paths,
+                                 self.sample_rate >= 1 or random.random() < self.sample_rate)
+        token = _request_context.set(context)
+
+        start = time.perf_counter()
+        response = {"status": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [(b"x-request-id", request_id.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            level = logging.WARNING if response["status"] >= 500 else logging.INFO
+            if self.logger.isEnabledFor(level):
+                self.logger.log(level, "request", extra={
+                    "method": scope["method"],
+                    "status": response["status"],
+                    "duration_ms": round((time.perf_counter() - start) * 1000, 2),
+                })
+            _request_context.reset(token)
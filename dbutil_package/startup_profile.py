@@ -0,0 +1,143 @@
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from importlib.abc import MetaPathFinder
+
+
+def _process_started_at():
+    """Wall-clock start of this process from /proc, so interpreter start-up counts too. None off Linux."""
+    try:
+        with open("/proc/self/stat") as stat:
+            # fields after the parenthesised command name start at field 3, starttime is field 22
+            start_ticks = int(stat.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as uptime:
+            booted_at = time.time() - float(uptime.read().split()[0])
+        return booted_at + start_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class _TimedLoader:
+    """Wraps a module loader to record how long executing the module took, imports it triggers included."""
+
+    def __init__(self, loader, timings: dict, name: str):
+        self._loader = loader
+        self._timings = timings
+        self._name = name
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        start = time.perf_counter()
+        try:
+            self._loader.exec_module(module)
+        finally:
+            self._timings[self._name] = time.perf_counter() - start
+
+    def __getattr__(self, name):
+        return getattr(self._loader, name)
+
+
+class ImportTimer(MetaPathFinder):
+    """Cumulative import time per module, like `python -X importtime` but readable from the running service."""
+
+    def __init__(self):
+        self.timings = {}
+        self._finding = threading.local()
+
+    def find_spec(self, fullname, path=None, target=None):
+        if getattr(self._finding, "active", False):
+            return None
+        self._finding.active = True
+        try:
+            for finder in sys.meta_path:
+                if finder is self or not hasattr(finder, "find_spec"):
+                    continue
+                spec = finder.find_spec(fullname, path, target)
+                if spec is None:
+                    continue
+                if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+                    spec.loader = _TimedLoader(spec.loader, self.timings, fullname)
+                return spec
+            return None
+        finally:
+            self._finding.active = False
+
+    def slowest(self, count: int = 25) -> list:
+        ranked = sorted(self.timings.items(), key=lambda item: item[1], reverse=True)[:count]
+        return [{"module": name, "seconds": round(seconds, 4)} for name, seconds in ranked]
+
+
+class StartupProfile:
+    """Where a worker's cold start goes: marks in seconds since the process started, and named phase durations.
+
+    With STARTUP_PROFILE_IMPORTS=true the cumulative import time of every module imported after this one is recorded
+    as well; import this module first to cover the rest.
+    """
+
+    def __init__(self, time_imports: bool = False):
+        started = _process_started_at()
+        self.process_started_at = started if started is not None else time.time()
+        self.marks = {}
+        self.phases = {}
+        self.import_timer = None
+        if time_imports:
+            self.import_timer = ImportTimer()
+            sys.meta_path.insert(0, self.import_timer)
+        self.mark("profile_imported")
+
+    def mark(self, name: str):
+        """Record the first time `name` is reached."""
+        self.marks.setdefault(name, round(time.time() - self.process_started_at, 4))
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = round(time.perf_counter() - start, 4)
+
+    def stop_import_timer(self):
+        if self.import_timer is not None and self.import_timer in sys.meta_path:
+            sys.meta_path.remove(self.import_timer)
+
+    def report(self) -> dict:
+        report = {
+            "process_started_at": datetime.fromtimestamp(self.process_started_at).isoformat(timespec="milliseconds"),
+            "marks": dict(self.marks),
+            "phases": dict(self.phases),
+        }
+        if self.import_timer is not None:
+            report["slowest_imports"] = self.import_timer.slowest()
+        return report
+
+
+class FirstRequestMiddleware:
+    """Marks `first_request` when the first HTTP response is sent and logs the startup report once."""
+
+    def __init__(self, app, profile: StartupProfile):
+        self.app = app
+        self.profile = profile
+        self.seen = False
+
+    async def __call__(self, scope, receive, send):
+        if self.seen or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        self.seen = True
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.profile.mark("first_request")
+            self.profile.stop_import_timer()
+            logging.info(f"Startup profile: {self.profile.report()}")
+
+
+startup_profile = StartupProfile(time_imports=os.getenv("STARTUP_PROFILE_IMPORTS", "false").lower() == "true")
@@ -1,18 +1,48 @@
+# .env is loaded before anything reads the environment: the settings below are read at import time, before the
+# retriever's pool is built
+from dotenv import load_dotenv
+load_dotenv()
+# First import after it: with STARTUP_PROFILE_IMPORTS=true it times every import below
+from dbutil_package.startup_profile import FirstRequestMiddleware, startup_profile
+import asyncio
+import hashlib
 import logging
+import math
+import os
 from datetime import datetime, date
-from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi import FastAPI, Header, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from fastapi.openapi.utils import get_openapi
+from starlette.background import BackgroundTask
 from pydantic import BaseModel, ValidationError, Json
-from typing import Any, Dict, List, Union
+from typing import Any, Dict, List, Optional, Union
 from dbutil_package.db_trades import AppRulesDataRetriever
+from dbutil_package.db_admission import AdmissionMiddleware
+from dbutil_package.db_breaker import CircuitBreaker
+from dbutil_package.db_changes import RuleChangeFeed
+from dbutil_package.db_executor import DBExecutor
+from dbutil_package.db_export import EXPORT_DATASETS, ExportStream, csv_lines, ndjson_lines
+from dbutil_package.db_metrics import MetricsMiddleware, metrics
+from dbutil_package.db_singleflight import SingleFlight, SingleFlightTimeout
+from dbutil_package.db_snapshot import ReferenceSnapshot
+from dbutil_package.fast_json import FastJSONResponse, conditional_json_response, dumps
+from dbutil_package.lazy import LazyInstance
+from dbutil_package.log_pipeline import QueueLogging, RequestLogMiddleware, sample_rate_from_env
 import json
 from enum import Enum, IntEnum
 
 from dbutil_package.dbutil.logger_config import setup_logging
 
-# Initialize logging.
-setup_logging()
+try:
+    from brotli_asgi import BrotliMiddleware
+except ImportError:  # brotli is optional, RESPONSE_COMPRESSION=brotli falls back to gzip
+    BrotliMiddleware = None
+
+# Started by the `initialize` startup hook, after setup_logging(): moves the log handlers behind a queue so request
+# handlers never block on log I/O
+queue_logging = LazyInstance(QueueLogging.start, name="queue_logging")
 
 
 class RuleStatusEnum(Enum):
@@ -29,6 +59,19 @@ class ApplicationRuleUpdateModel(BaseModel):
     notes: str
 
 
+class AppRuleReviewModel(BaseModel):
+    id: int
+    ruleId: int
+    override: bool
+    status: str
+    notes: str
+
+
+class BulkAppRuleReviewModel(BaseModel):
+    applicationId: int
+    rules: List[AppRuleReviewModel]
+
+
 class InvestorTypeModel(BaseModel):
     name: str
     description: str
@@ -36,6 +79,11 @@ class InvestorTypeModel(BaseModel):
     # created_by: str
 
 
+class BulkInvestorTypeModel(InvestorTypeModel):
+    investor_id: int
+    created_by: str
+
+
 class OptionalEnum(int, Enum):
     true = 0
     false = 1
@@ -57,6 +105,30 @@ class TradeDocMetaModel(BaseModel):
     created_by: str
 
 
+class ShapeEnum(str, Enum):
+    records = 'records'
+    columnar = 'columnar'
+    rows = 'rows'
+
+
+class AggregateDimensionEnum(str, Enum):
+    issuer_id = 'issuer_id'
+    trans_type_id = 'trans_type_id'
+    posting_date = 'posting_date'
+    withdrawal_deposit = 'withdrawal_deposit'
+
+
+class ExportFormatEnum(str, Enum):
+    ndjson = 'ndjson'
+    csv = 'csv'
+
+
+class ExportDatasetEnum(str, Enum):
+    trades = 'trades'
+    trade_docs_meta = 'trade_docs_meta'
+    app_doc_uploads = 'app_doc_uploads'
+
+
 class TransactionCreateModel(BaseModel):
     trans_acc_no: int
     trade_id: int
@@ -68,6 +140,10 @@ class TransactionCreateModel(BaseModel):
     created_by: str
 
 
+class BulkTransactionCreateModel(TransactionCreateModel):
+    idempotency_key: Optional[str] = None
+
+
 # # Function to handle datetime and date object serialization.
 # def _json_serial(obj):
 #     if isinstance(obj, (datetime, date)):
@@ -85,19 +161,245 @@ class DatabaseError(Exception):
     pass
 
 
-data_retriever = AppRulesDataRetriever()
+DEFAULT_TRADE_PAGE_SIZE = 500
+MAX_BUNDLE_APP_IDS = 100
+MAX_FEED_APP_IDS = 500
+MAX_BULK_ROWS = 5000
+FIELDS_DESCRIPTION = "Comma separated columns to return, unknown columns are rejected with the available list"
+# Reference lists are served from the retriever cache, let clients reuse them briefly before revalidating
+REFERENCE_CACHE_CONTROL = "private, max-age=30, must-revalidate"
+
+
+# Shared with the admission middleware, which needs it before the retriever exists
+db_breaker = CircuitBreaker.from_env()
+
+
+def _build_retriever() -> AppRulesDataRetriever:
+    with startup_profile.phase("retriever_init"):
+        retriever = AppRulesDataRetriever(breaker=db_breaker)
+    startup_profile.mark("retriever_built")
+    return retriever
+
+
+# Built on the DB executor during warm-up, not at import: DatabaseHandler and the pools read the environment
+data_retriever = LazyInstance(_build_retriever, name="data_retriever")
+
+# All retriever calls are blocking, dispatch them through a bounded thread pool
+db_executor = DBExecutor()
+
+# Identical concurrent reads share one DB executor call, the others wait on the event loop without holding a slot
+single_flight = SingleFlight(wait_timeout=float(os.getenv("SP_SINGLE_FLIGHT_TIMEOUT", "30"))) \
+    if os.getenv("SP_SINGLE_FLIGHT_ENABLED", "true").lower() == "true" else None
+
+
+def _flight_key(value):
+    return tuple(value) if isinstance(value, list) else value
+
+
+async def run_read(fn, *args, **kwargs):
+    """`db_executor.run` for read-only retriever calls, collapsed with identical calls in flight. Each caller gets its
+    own copy of the result envelope."""
+    if single_flight is None:
+        return await db_executor.run(fn, *args, **kwargs)
+    key = (fn.__name__, tuple(_flight_key(arg) for arg in args),
+           tuple(sorted((name, _flight_key(value)) for name, value in kwargs.items())))
+    try:
+        result = await single_flight.do(key, db_executor.run, fn, *args, **kwargs)
+    except SingleFlightTimeout as e:
+        logging.error(f"{fn.__name__}: {e}")
+        return {"status": "error", "message": str(e), "error_code": "SF_TIMEOUT"}
+    return dict(result) if isinstance(result, dict) else result
+
+app = FastAPI(default_response_class=FastJSONResponse)
+
+# Written by serve.py before the workers start, absent when running a single uvicorn process
+reference_snapshot = ReferenceSnapshot.from_env()
+WARM_UP_RETRY_SECONDS = float(os.getenv("WARM_UP_RETRY_SECONDS", "5"))
+readiness = {"ready": False, "warm_up": None}
+_background_tasks = set()
+# Subscribed applications are re-read this often to pick up rule changes made outside this worker, 0 disables
+APP_RULES_FEED_POLL_SECONDS = float(os.getenv("APP_RULES_FEED_POLL_SECONDS", "5"))
+APP_RULES_FEED_HEARTBEAT_SECONDS = float(os.getenv("APP_RULES_FEED_HEARTBEAT_SECONDS", "15"))
+# Trade aggregates are recomputed in the background this often, 0 leaves it to TRADE_AGGREGATES_MAX_AGE
+TRADE_AGGREGATES_REFRESH_SECONDS = float(os.getenv("TRADE_AGGREGATES_REFRESH_SECONDS", "900"))
+# Retry-After of /trade_aggregates while the first summaries are built
+TRADE_AGGREGATES_RETRY_AFTER = 5
+trade_aggregates_rebuild = {"task": None}
+
+
+def _start_background_task(coro) -> asyncio.Task:
+    task = asyncio.get_running_loop().create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+
+def _warm_up_once() -> dict:
+    with startup_profile.phase("warm_up"):
+        report = data_retriever.warm_up(reference_snapshot)
+    readiness.update(ready=True, warm_up=report)
+    startup_profile.mark("ready")
+    logging.info(f"Warm-up done from {report['source']} in {report['seconds']}s")
+    return report
+
+
+async def _retry_warm_up():
+    while not readiness["ready"]:
+        await asyncio.sleep(WARM_UP_RETRY_SECONDS)
+        try:
+            await db_executor.run(_warm_up_once)
+        except Exception as e:
+            logging.error(f"Warm-up retry failed: {e}")
+
+
+@app.on_event("startup")
+async def initialize():
+    # Registered first: everything with side effects that used to run at import
+    with startup_profile.phase("logging"):
+        setup_logging()
+        queue_logging.get()
+    startup_profile.mark("startup")
+
+
+@app.on_event("startup")
+async def warm_up():
+    # Runs before the server accepts connections; /readyz stays 503 until a warm-up succeeds
+    try:
+        await db_executor.run(_warm_up_once)
+    except Exception as e:
+        logging.error(f"Warm-up failed, retrying every {WARM_UP_RETRY_SECONDS}s: {e}")
+        _start_background_task(_retry_warm_up())
+
+
+async def _poll_rule_changes():
+    # one lookup per subscribed application per interval, however many clients watch it
+    while True:
+        await asyncio.sleep(APP_RULES_FEED_POLL_SECONDS)
+        app_ids = data_retriever.rule_changes.subscribed_app_ids()
+        results = await db_executor.gather((data_retriever.poll_app_rules, app_id) for app_id in app_ids)
+        for app_id, result in zip(app_ids, results):
+            if isinstance(result, Exception):
+                logging.error(f"Failed to poll rules for application {app_id}: {result}")
+
+
+async def _rebuild_trade_aggregates():
+    try:
+        await db_executor.run(data_retriever.rebuild_trade_aggregates)
+    except Exception as e:
+        logging.error(f"Trade aggregates rebuild failed: {e}")
+
+
+def _start_trade_aggregates_rebuild():
+    # one rebuild at a time, requests never wait for it
+    task = trade_aggregates_rebuild["task"]
+    if (task is None or task.done()) and not data_retriever.trade_aggregates_rebuilding():
+        trade_aggregates_rebuild["task"] = _start_background_task(_rebuild_trade_aggregates())
+
+
+async def _refresh_trade_aggregates():
+    # the summaries live on the retriever, built by the warm-up or its retry on the DB executor
+    while not data_retriever.built:
+        await asyncio.sleep(WARM_UP_RETRY_SECONDS)
+    while True:
+        await _rebuild_trade_aggregates()
+        await asyncio.sleep(TRADE_AGGREGATES_REFRESH_SECONDS)
+
+
+@app.on_event("startup")
+async def schedule_trade_aggregates():
+    if TRADE_AGGREGATES_REFRESH_SECONDS > 0:
+        _start_background_task(_refresh_trade_aggregates())
+
+
+@app.on_event("startup")
+async def start_rule_change_feed():
+    if not readiness["ready"]:
+        # the feed lives on the retriever, bind it once the warm-up retry has built it
+        _start_background_task(_start_rule_change_feed_when_ready())
+        return
+    data_retriever.rule_changes.bind(asyncio.get_running_loop())
+    if APP_RULES_FEED_POLL_SECONDS > 0:
+        _start_background_task(_poll_rule_changes())
+
+
+async def _start_rule_change_feed_when_ready():
+    while not readiness["ready"]:
+        await asyncio.sleep(WARM_UP_RETRY_SECONDS)
+    await start_rule_change_feed()
+
+
+@app.on_event("startup")
+async def prepare_openapi():
+    # off the loop, so the first /openapi.json (or /docs) is served from memory
+    if app.openapi_schema is None:
+        _start_background_task(asyncio.to_thread(custom_openapi))
+
+
+@app.on_event("shutdown")
+def shutdown_db_executor():
+    readiness["ready"] = False
+    for task in _background_tasks:
+        task.cancel()
+    db_executor.shutdown()
+    if data_retriever.built and data_retriever.pool is not None:
+        data_retriever.pool.close()
+        data_retriever.router.close()
+
+
+@app.on_event("shutdown")
+def stop_queue_logging():
+    # registered last so shutdown messages above are flushed
+    if queue_logging.built:
+        queue_logging.stop()
+
+
+# Schema generated by `python serve.py --write-openapi <path>` at build time, or written here on first generation
+OPENAPI_SCHEMA_PATH = os.getenv("OPENAPI_SCHEMA_PATH")
+
+
+def _openapi_fingerprint() -> str:
+    # routes and models are all declared in this file, a cached schema is stale as soon as it changes
+    with open(__file__, "rb") as source:
+        return hashlib.blake2b(source.read(), digest_size=16).hexdigest()
+
+
+def _load_openapi_schema():
+    try:
+        with open(OPENAPI_SCHEMA_PATH, "rb") as cached:
+            cached = json.loads(cached.read())
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logging.warning(f"Ignoring unreadable OpenAPI schema {OPENAPI_SCHEMA_PATH}: {e}")
+        return None
+    if cached.get("fingerprint") != _openapi_fingerprint():
+        return None
+    return cached["schema"]
 
-app = FastAPI()
+
+def write_openapi_schema(path: str, schema: dict):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as tmp:
+        tmp.write(dumps({"fingerprint": _openapi_fingerprint(), "schema": schema}))
+    os.replace(tmp_path, path)
 
 
 def custom_openapi():
     if app.openapi_schema:
         return app.openapi_schema
-    openapi_schema = get_openapi(
-        title="STAX_BO_TRADES", version="0.1.0",
-        openapi_version="3.0.0",
-        routes=app.routes,
-    )
+    with startup_profile.phase("openapi"):
+        openapi_schema = _load_openapi_schema() if OPENAPI_SCHEMA_PATH else None
+        if openapi_schema is None:
+            openapi_schema = get_openapi(
+                title="STAX_BO_TRADES", version="0.1.0",
+                openapi_version="3.0.0",
+                routes=app.routes,
+            )
+            if OPENAPI_SCHEMA_PATH:
+                try:
+                    write_openapi_schema(OPENAPI_SCHEMA_PATH, openapi_schema)
+                except OSError as e:
+                    logging.warning(f"Could not cache the OpenAPI schema to {OPENAPI_SCHEMA_PATH}: {e}")
     app.openapi_schema = openapi_schema
     return app.openapi_schema
 
@@ -119,6 +421,126 @@ app.add_middleware(
 )
 
 
+_route_paths = {}
+
+
+def route_paths() -> dict:
+    """Endpoint function -> path template, built once all routes are registered."""
+    if not _route_paths:
+        _route_paths.update({route.endpoint: route.path for route in app.routes if hasattr(route, "endpoint")})
+    return _route_paths
+
+
+# Per-route latency and payload size histograms, exported at /metrics
+app.add_middleware(MetricsMiddleware, route_paths=route_paths)
+
+# Response compression, added after MetricsMiddleware so payload sizes are recorded before compression
+RESPONSE_COMPRESSION = os.getenv("RESPONSE_COMPRESSION", "gzip").lower()
+if RESPONSE_COMPRESSION == "brotli" and BrotliMiddleware is not None:
+    app.add_middleware(BrotliMiddleware, minimum_size=1024)
+elif RESPONSE_COMPRESSION in ("gzip", "brotli"):
+    app.add_middleware(GZipMiddleware, minimum_size=1024)
+
+
+class IdentityEncodingMiddleware:
+    """Drops Accept-Encoding for `paths` so the compression middleware leaves their responses alone.
+
+    The compressors buffer streamed chunks, which would hold Server-Sent Events back.
+    """
+
+    def __init__(self, app, paths=()):
+        self.app = app
+        self.paths = frozenset(paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"] in self.paths:
+            scope = dict(scope, headers=[(name, value) for name, value in scope["headers"]
+                                         if name != b"accept-encoding"])
+        await self.app(scope, receive, send)
+
+
+app.add_middleware(IdentityEncodingMiddleware, paths=("/app_rules/changes",))
+
+# Shed load with 503 + Retry-After instead of queueing without bound when the DB is slow or down. Reference lists
+# stay admitted while the breaker is open, the retriever serves them from stale cache.
+SHED_RETRY_AFTER = float(os.getenv("SHED_RETRY_AFTER", "1"))
+STALE_SERVABLE_PATHS = ("/list_all_transaction_types", "/list_issuers_list", "/list_investor_type",
+                        "/list_trade_docs_meta", "/list_document_type_name/", "/list_document_type_id/",
+                        "/lookup_forms/", "/required_docs", "/trade_aggregates")
+app.add_middleware(AdmissionMiddleware, executor=db_executor, breaker=db_breaker,
+                   max_queued=int(os.getenv("DB_MAX_QUEUED", str(4 * db_executor.max_concurrency))),
+                   retry_after=SHED_RETRY_AFTER,
+                   exempt_paths=("/healthz", "/readyz", "/metrics", "/pool_stats", "/cache_stats",
+                                 "/startup_profile"),
+                   stale_paths=STALE_SERVABLE_PATHS,
+                   # routes read retriever attributes on the event loop, only once warm-up has built it
+                   ready=lambda: data_retriever.built)
+
+# Outermost, so the request id is bound for everything logged while handling the request
+app.add_middleware(RequestLogMiddleware, route_paths=route_paths, sample_rate=sample_rate_from_env())
+
+# Outside everything else so the first response is marked once fully sent
+app.add_middleware(FirstRequestMiddleware, profile=startup_profile)
+
+
+def _runtime_gauges():
+    executor = db_executor.stats()
+    gauges = [
+        ("db_executor_in_flight", "Retriever calls running on the DB executor", [({}, executor["in_flight"])]),
+        ("db_executor_waiting", "Retriever calls waiting for a DB executor slot", [({}, executor["waiting"])]),
+    ]
+    if not data_retriever.built or not queue_logging.built:
+        # scraped before warm-up built them, never build them from the event loop
+        return gauges
+    cache = data_retriever.cache_stats()
+    pools = [data_retriever.pool_stats()] + data_retriever.replica_stats().get("replicas", [])
+    pools = [pool for pool in pools if pool]
+    if pools:
+        gauges += [
+            ("db_pool_size", "Open pooled connections", [({"pool": pool["name"]}, pool["size"]) for pool in pools]),
+            ("db_pool_in_use", "Checked out pooled connections",
+             [({"pool": pool["name"]}, pool["in_use"]) for pool in pools]),
+            ("db_pool_max_size", "Pool size limit", [({"pool": pool["name"]}, pool["max_size"]) for pool in pools]),
+            ("db_pool_timeouts", "Checkouts that timed out since start",
+             [({"pool": pool["name"]}, pool["timeouts"]) for pool in pools]),
+        ]
+    if cache:
+        gauges += [
+            ("sp_cache_hits", "Reference-data cache hits since start", [({}, cache["hits"])]),
+            ("sp_cache_misses", "Reference-data cache misses since start", [({}, cache["misses"])]),
+            ("sp_cache_entries", "Reference-data cache entries", [({}, cache["entries"])]),
+        ]
+    if single_flight is not None:
+        collapse = single_flight.stats()
+        gauges += [
+            ("sp_single_flight_executions", "Read calls that led a single-flight group",
+             [({}, collapse["executions"])]),
+            ("sp_single_flight_collapsed", "Read calls that reused an in-flight execution",
+             [({}, collapse["collapsed"])]),
+            ("sp_single_flight_timeouts", "Collapsed calls that gave up waiting", [({}, collapse["timeouts"])]),
+        ]
+    breaker = data_retriever.breaker_stats()
+    gauges += [
+        ("db_breaker_open", "1 while the DB circuit breaker rejects calls", [({}, int(breaker["state"] == "open"))]),
+        ("db_breaker_opened", "Times the DB circuit breaker opened since start", [({}, breaker["opened"])]),
+    ]
+    feed = data_retriever.rule_changes_stats()
+    gauges += [
+        ("app_rules_feed_subscriptions", "Open /app_rules/changes streams", [({}, feed["subscriptions"])]),
+        ("app_rules_feed_resyncs", "Change events replaced by a resync for a lagging client",
+         [({}, feed["resyncs"])]),
+    ]
+    logs = queue_logging.stats()
+    gauges += [
+        ("log_queue_depth", "Log records waiting for the listener thread", [({}, logs["queue_depth"])]),
+        ("log_records_dropped", "Log records dropped because the queue was full", [({}, logs["dropped"])]),
+    ]
+    return gauges
+
+
+metrics.register_collector(_runtime_gauges)
+
+
 # Helper function to handle errors
 def handle_error(e: Exception, message: str):
     logging.error(f"{message}: {e}")
@@ -134,7 +556,7 @@ def handle_error(e: Exception, message: str):
 
 @app.get("/lookup_app_rules/{app_id}", status_code=200)
 async def lookup_app_rules(app_id: int):
-    result = data_retriever.lookup_app_rules(app_id)
+    result = await run_read(data_retriever.lookup_app_rules, app_id)
 
     if result.get("status") == "error":
         if result.get("error_code") == "DB_ERR":
@@ -154,7 +576,7 @@ async def lookup_app_rules(app_id: int):
 
 @app.get("/look_app_rule_by_id", status_code=200)
 async def look_app_rule_by_id(app_id: int, rule_id: int):
-    result = data_retriever.look_app_rule_by_id(app_id, rule_id)
+    result = await run_read(data_retriever.look_app_rule_by_id, app_id, rule_id)
     if result.get("status") == "error":
         if result.get("error_code") == "DB_ERR":
             return {"status": "error", "message": "Database Error: Application Rule does not exist"}
@@ -187,7 +609,7 @@ async def update_app_rule(app_rule_data: ApplicationRuleUpdateModel):
             return {"status": "error",
                     "message": f"Application Rule Status must be PASS or FAIL: {app_rule_data_dict['status']}"}
 
-        result = data_retriever.update_app_rule(app_rule_data_dict)
+        result = await db_executor.run(data_retriever.update_app_rule, app_rule_data_dict)
 
         if result.get('status') == 'error':
             # db error check
@@ -209,13 +631,51 @@ async def update_app_rule(app_rule_data: ApplicationRuleUpdateModel):
         return {"status": "error", "message": f"Unexpected error while updating app rule: {e}"}
 
 
+# Review several rules of one application at once, in one transaction, returns the application's updated rules
+@app.post("/bulk_update_app_rules/")
+async def bulk_update_app_rules(app_rule_review: BulkAppRuleReviewModel):
+    try:
+        rules = [rule.model_dump() for rule in app_rule_review.rules]
+        if not rules or len(rules) > MAX_BULK_ROWS:
+            return {"status": "error", "message": f"Provide between 1 and {MAX_BULK_ROWS} rules"}
+
+        invalid = [rule['ruleId'] for rule in rules if rule['status'] not in ['PASS', 'FAIL']]
+        if invalid:
+            logging.error(f"Application Rule Status must be PASS or FAIL, rules: {invalid}")
+            return {"status": "error", "message": f"Application Rule Status must be PASS or FAIL, rules: {invalid}"}
+        rule_ids = [rule['ruleId'] for rule in rules]
+        if len(set(rule_ids)) < len(rule_ids):
+            return {"status": "error", "message": "Each rule may only be reviewed once per request"}
+
+        for rule in rules:
+            rule['user'] = 'user'
+        app_id = app_rule_review.applicationId
+        result = await db_executor.run(data_retriever.bulk_update_app_rules, app_id, rules)
+
+        if result.get('status') == 'error':
+            for rule_result in result.get('results', []):
+                # db error check, same message as /update_app_rule/
+                if rule_result["status"] == "error" and '45000' in rule_result.get('message', ''):
+                    db_error = str(rule_result["message"]).split(':')[-1].strip().lower()
+                    rule_result["message"] = f"Error while updating app rule: {db_error}"
+            logging.error(f"Error while updating app rules for application {app_id}: {result['message']}")
+            return result
+
+        logging.info(f"Successfully updated {result['updated']} app rules for application {app_id}")
+        return result
+
+    except Exception as e:
+        logging.exception(f"Unexpected error while updating app rules: {e}")
+        return {"status": "error", "message": f"Unexpected error while updating app rules: {e}"}
+
+
 # Create trade doc meta
 @app.post("/create_trade_doc_meta")
 async def create_trade_doc_meta(trade_doc_meta: TradeDocMetaModel):
     try:
         trade_doc_meta_dict = trade_doc_meta.model_dump()
         trade_doc_meta_dict['optional'] = trade_doc_meta_dict['optional'].value
-        result = data_retriever.create_trade_documents_meta(trade_doc_meta_dict)
+        result = await db_executor.run(data_retriever.create_trade_documents_meta, trade_doc_meta_dict)
 
         if result.get('status') == 'error' and '45000' in result['message']:
             result["message"] = "Failed to create trade documents meta"
@@ -238,7 +698,7 @@ async def update_trade_doc_meta(trade_doc_meta: TradeDocMetaModel):
     try:
         trade_doc_meta_dict = trade_doc_meta.model_dump()
         trade_doc_meta_dict['optional'] = trade_doc_meta_dict['optional'].value
-        result = data_retriever.update_trade_documents_meta(trade_doc_meta_dict)
+        result = await db_executor.run(data_retriever.update_trade_documents_meta, trade_doc_meta_dict)
 
         if result["status"] == "success" and result["message"] == "message":
             result["message"] = "successfully update trade document meta"
@@ -256,7 +716,7 @@ async def update_trade_doc_meta(trade_doc_meta: TradeDocMetaModel):
 async def delete_trade_doc_meta(trade_id: int):
     try:
         trade_doc_meta_dict = {"td_id": trade_id, "create_by": "Admin"}
-        result = data_retriever.delete_trade_documents_meta(trade_doc_meta_dict)
+        result = await db_executor.run(data_retriever.delete_trade_documents_meta, trade_doc_meta_dict)
 
         if result.get('status') == 'error' and '45000' in result['message']:
             result["message"] = 'Trade document meta does not exist'
@@ -276,18 +736,112 @@ async def delete_trade_doc_meta(trade_id: int):
 
 # List trade doc meta
 @app.get("/list_trade_docs_meta")
-async def list_trade_docs_meta():
+async def list_trade_docs_meta(request: Request, shape: ShapeEnum = ShapeEnum.records):
     try:
-        result = data_retriever.list_trade_docs_meta()
+        result = await run_read(data_retriever.list_trade_docs_meta, shape.value)
         if result['status'] == 'success':
             logging.info("Successfully retrieved list trade document meta")
-        return result
+        return conditional_json_response(request, result, REFERENCE_CACHE_CONTROL, memoize=True)
 
     except Exception as e:
         logging.error(f"Failed to retrieve trade documents meta {e}")
         return {"status": "error", "message": "Failed to retrieve trade documents meta"}
 
 
+# Required / optional document types for an issuer and investor type, answered from the in-memory index
+@app.get("/required_docs")
+async def required_docs(request: Request, issuer_id: int, investor_type: int):
+    try:
+        if data_retriever.required_docs_fresh():
+            # index lookup only, not worth an executor hop
+            result = data_retriever.required_documents(issuer_id, investor_type)
+        else:
+            result = await run_read(data_retriever.required_documents, issuer_id, investor_type)
+        return conditional_json_response(request, result, REFERENCE_CACHE_CONTROL, memoize=True)
+
+    except Exception as e:
+        logging.error(f"Failed to resolve required documents {e}")
+        return {"status": "error", "message": "Failed to resolve required documents"}
+
+
+def _trade_doc_meta_params(trade_doc_meta: TradeDocMetaModel) -> dict:
+    trade_doc_meta_dict = trade_doc_meta.model_dump()
+    trade_doc_meta_dict['optional'] = trade_doc_meta_dict['optional'].value
+    return trade_doc_meta_dict
+
+
+def _investor_type_params():
+    # bulk rows name their own investor_id, each at most once per request
+    seen = set()
+
+    def to_params(investor_type: BulkInvestorTypeModel) -> dict:
+        if investor_type.investor_id <= 0:
+            raise ValueError(f"investor_id must be positive, got {investor_type.investor_id}")
+        if investor_type.investor_id in seen:
+            raise ValueError(f"investor_id {investor_type.investor_id} appears more than once in this request")
+        seen.add(investor_type.investor_id)
+        return investor_type.model_dump()
+    return to_params
+
+
+async def _bulk_write(rows: List[Dict[str, Any]], model, to_params, retriever_method, atomic: bool, label: str):
+    """Validate every row in one pass, then write the valid ones in one transaction. Reports a result per row.
+
+    `to_params` turns a validated model into the retriever dict and may raise ValueError for business rule checks.
+    """
+    if not rows or len(rows) > MAX_BULK_ROWS:
+        return {"status": "error", "message": f"Provide between 1 and {MAX_BULK_ROWS} rows"}
+
+    row_results = [None] * len(rows)
+    valid = []
+    for index, row in enumerate(rows):
+        try:
+            valid.append((index, to_params(model.model_validate(row))))
+        except ValidationError as e:
+            errors = "; ".join(f"{'.'.join(str(loc) for loc in error['loc'])}: {error['msg']}" for error in e.errors())
+            row_results[index] = {"status": "error", "message": errors, "error_code": "VALIDATION_ERR"}
+        except ValueError as e:
+            row_results[index] = {"status": "error", "message": str(e), "error_code": "VALIDATION_ERR"}
+
+    if atomic and len(valid) < len(rows):
+        logging.error(f"Bulk {label}: {len(rows) - len(valid)} rows failed validation, nothing written")
+        for index, _ in valid:
+            row_results[index] = {"status": "error", "message": "Not written, other rows failed validation"}
+    elif valid:
+        db_results = await db_executor.run(retriever_method, [params for _, params in valid], atomic=atomic)
+        for (index, _), result in zip(valid, db_results):
+            row_results[index] = result
+
+    failed = sum(1 for result in row_results if result["status"] != "success")
+    logging.info(f"Bulk {label}: {len(rows) - failed} rows written, {failed} failed")
+    return {"status": "success" if not failed else "error" if failed == len(rows) else "partial",
+            "written": len(rows) - failed, "failed": failed, "results": row_results}
+
+
+# Bulk create trade doc meta, one transaction, all or nothing unless atomic=false
+@app.post("/bulk_create_trade_doc_meta")
+async def bulk_create_trade_doc_meta(trade_doc_metas: List[Dict[str, Any]], atomic: bool = True):
+    try:
+        return await _bulk_write(trade_doc_metas, TradeDocMetaModel, _trade_doc_meta_params,
+                                 data_retriever.bulk_create_trade_documents_meta, atomic, "create trade doc meta")
+
+    except Exception as e:
+        logging.exception(f"Failed to bulk create trade documents meta {e}")
+        return {"status": "error", "message": "Failed to bulk create trade documents meta"}
+
+
+# Bulk update trade doc meta
+@app.post("/bulk_update_trade_doc_meta")
+async def bulk_update_trade_doc_meta(trade_doc_metas: List[Dict[str, Any]], atomic: bool = True):
+    try:
+        return await _bulk_write(trade_doc_metas, TradeDocMetaModel, _trade_doc_meta_params,
+                                 data_retriever.bulk_update_trade_documents_meta, atomic, "update trade doc meta")
+
+    except Exception as e:
+        logging.exception(f"Failed to bulk update trade documents meta {e}")
+        return {"status": "error", "message": "Failed to bulk update trade documents meta"}
+
+
 # Create investor type
 @app.post("/create_investor_type")
 async def create_investor_type(investor_type: InvestorTypeModel):
@@ -297,7 +851,7 @@ async def create_investor_type(investor_type: InvestorTypeModel):
         investor_type_dict['created_by'] = "Admin"
         investor_type_dict['investor_id'] = 1007
 
-        result = data_retriever.create_investor_type(investor_type_dict)
+        result = await db_executor.run(data_retriever.create_investor_type, investor_type_dict)
 
         if result['status'] == 'success' and result['message'] == 'message':
             result['message'] = "Successfully create investor type"
@@ -320,7 +874,7 @@ async def update_investor_type(investor_type: InvestorTypeModel):
         investor_type_dict['created_by'] = "Admin"
         investor_type_dict['investor_id'] = 1007
 
-        result = data_retriever.update_investor_type(investor_type_dict)
+        result = await db_executor.run(data_retriever.update_investor_type, investor_type_dict)
 
         if result['status'] == 'success' and result['message'] == 'message':
             result['message'] = "Successfully update investor type"
@@ -341,7 +895,7 @@ async def delete_investor_type(investor_id: int):
         # hardcode created_by
         investor_type_dict = {"investor_id": investor_id, "created_by": "Admin"}
 
-        result = data_retriever.delete_investor_type(investor_type_dict)
+        result = await db_executor.run(data_retriever.delete_investor_type, investor_type_dict)
 
         if result['status'] == 'success' and result['message'] == 'message':
             result['message'] = "Successfully investor type deleted"
@@ -354,26 +908,108 @@ async def delete_investor_type(investor_id: int):
         return {"status": "error", "message": f"failed to delete investor_type"}
 
 
+# Bulk create investor type
+@app.post("/bulk_create_investor_type")
+async def bulk_create_investor_type(investor_types: List[Dict[str, Any]], atomic: bool = True):
+    try:
+        return await _bulk_write(investor_types, BulkInvestorTypeModel, _investor_type_params(),
+                                 data_retriever.bulk_create_investor_type, atomic, "create investor type")
+
+    except Exception as e:
+        logging.exception(f"Failed to bulk create investor type {e}")
+        return {"status": "error", "message": "Failed to bulk create investor type"}
+
+
+# Bulk update investor type
+@app.post("/bulk_update_investor_type")
+async def bulk_update_investor_type(investor_types: List[Dict[str, Any]], atomic: bool = True):
+    try:
+        return await _bulk_write(investor_types, BulkInvestorTypeModel, _investor_type_params(),
+                                 data_retriever.bulk_update_investor_type, atomic, "update investor type")
+
+    except Exception as e:
+        logging.exception(f"Failed to bulk update investor type {e}")
+        return {"status": "error", "message": "Failed to bulk update investor type"}
+
+
 # List investor type
 @app.get("/list_investor_type")
-async def list_investor_type():
+async def list_investor_type(request: Request, shape: ShapeEnum = ShapeEnum.records):
     try:
-        result = data_retriever.list_all_investor_type()
+        result = await run_read(data_retriever.list_all_investor_type, shape.value)
         logging.info("successfully list all investor type")
-        return result
+        return conditional_json_response(request, result, REFERENCE_CACHE_CONTROL, memoize=True)
 
     except Exception as e:
         logging.error(f"failed to retrieve List all investor type {e}")
         return {"status": "error", "message": f"failed to retrieve all List all investor type"}
 
 
+def _transaction_params(transaction_type_ids: frozenset, idempotency_key: str = None):
+    def to_params(transaction: TransactionCreateModel) -> dict:
+        if transaction.trans_type_id not in transaction_type_ids:
+            raise ValueError(f"Unknown trans_type_id {transaction.trans_type_id}")
+        transaction_dict = transaction.model_dump()
+        transaction_dict['withdrawal_deposit'] = transaction_dict['withdrawal_deposit'].value
+        transaction_dict.setdefault('idempotency_key', idempotency_key)
+        return transaction_dict
+    return to_params
+
+
+# Post one transaction, retries with the same Idempotency-Key header are not posted twice
+@app.post("/create_transaction")
+async def create_transaction(transaction: TransactionCreateModel,
+                             idempotency_key: str = Header(None, alias="Idempotency-Key")):
+    try:
+        transaction_type_ids = await db_executor.run(data_retriever.transaction_type_ids)
+        try:
+            transaction_dict = _transaction_params(transaction_type_ids, idempotency_key)(transaction)
+        except ValueError as e:
+            return {"status": "error", "message": str(e)}
+
+        result = await db_executor.run(data_retriever.create_transaction, transaction_dict)
+
+        if result.get('status') == 'error' and '45000' in result['message']:
+            result["message"] = "Failed to create transaction"
+            return result
+
+        if result["status"] == "success" and result["message"] == "message":
+            result["message"] = "Successfully create transaction"
+
+        logging.info(f"Successfully create transaction for trade {transaction.trade_id}")
+        return result
+
+    except Exception as e:
+        logging.exception(f"Failed to create transaction {e}")
+        return {"status": "error", "message": "Failed to create transaction"}
+
+
+# Post a batch of transactions in one DB transaction. Rows may carry their own idempotency_key,
+# otherwise row i uses "<Idempotency-Key>:<i>" when the header is given
+@app.post("/bulk_create_transactions")
+async def bulk_create_transactions(transactions: List[Dict[str, Any]], atomic: bool = True,
+                                   idempotency_key: str = Header(None, alias="Idempotency-Key")):
+    try:
+        transaction_type_ids = await db_executor.run(data_retriever.transaction_type_ids)
+        if idempotency_key:
+            transactions = [dict({"idempotency_key": f"{idempotency_key}:{index}"}, **row) if isinstance(row, dict)
+                            else row for index, row in enumerate(transactions)]
+
+        return await _bulk_write(transactions, BulkTransactionCreateModel, _transaction_params(transaction_type_ids),
+                                 data_retriever.bulk_create_transactions, atomic, "create transactions")
+
+    except Exception as e:
+        logging.exception(f"Failed to bulk create transactions {e}")
+        return {"status": "error", "message": "Failed to bulk create transactions"}
+
+
 # list issuers type
 @app.get("/list_issuers_list")
-async def list_issuers_list():
+async def list_issuers_list(request: Request):
     try:
-        result = data_retriever.list_issuers_list()
+        result = await run_read(data_retriever.list_issuers_list)
         logging.info("Successfully list all issuers")
-        return result
+        return conditional_json_response(request, result, REFERENCE_CACHE_CONTROL, memoize=True)
 
     except Exception as e:
         logging.error(f"Failed to retrieve list issuers type {e}")
@@ -384,7 +1020,7 @@ async def list_issuers_list():
 @app.get("/list_document_type_name/{type_name}")
 async def list_document_type_by_name(type_name: str):
     try:
-        result = data_retriever.lookup_list_document_type_by_name(type_name)
+        result = await run_read(data_retriever.lookup_list_document_type_by_name, type_name)
         logging.info(f"Successfully list all docs type by type_name")
         return result
 
@@ -397,7 +1033,7 @@ async def list_document_type_by_name(type_name: str):
 @app.get("/list_document_type_id/{type_id}")
 async def list_document_type_by_name(type_id: int):
     try:
-        result = data_retriever.lookup_list_document_type_by_id(type_id)
+        result = await run_read(data_retriever.lookup_list_document_type_by_id, type_id)
         logging.info(f" Successfully list all list docs")
         return result
 
@@ -408,45 +1044,84 @@ async def list_document_type_by_name(type_id: int):
 
 # List transaction type
 @app.get("/list_all_transaction_types")
-async def list_all_transaction_type():
+async def list_all_transaction_type(request: Request):
     try:
-        result = data_retriever.get_all_transaction_type()
+        result = await run_read(data_retriever.get_all_transaction_type)
         logging.info(f"Successfully retrieve transaction types")
-        return result
+        return conditional_json_response(request, result, REFERENCE_CACHE_CONTROL, memoize=True)
 
     except Exception as e:
         logging.error(f"Failed to retrieve transaction types{e}")
         return {"status": "error", "message": f"Failed to retrieve all transaction types"}
 
 
-# List all trades
+# List all trades, keyset paginated when limit or a filter is given
 @app.get("/list_all_trades")
-async def list_all_trade():
+async def list_all_trade(request: Request, limit: int = Query(None, ge=1, le=5000),
+                         after_id: int = Query(None, description="next_cursor of the previous page"),
+                         trade_id: int = None, date_from: date = None, date_to: date = None,
+                         issuer_id: int = None, trans_type_id: int = None,
+                         shape: ShapeEnum = ShapeEnum.records,
+                         fields: str = Query(None, description=FIELDS_DESCRIPTION)):
     try:
-        result = data_retriever.get_all_trade_list()
+        fields = _parse_csv_param(fields) if fields else None
+        filters = [after_id, trade_id, date_from, date_to, issuer_id, trans_type_id]
+        if limit is None and all(value is None for value in filters):
+            result = await run_read(data_retriever.get_all_trade_list, shape.value, fields)
+        else:
+            result = await run_read(data_retriever.get_trade_list_page, limit or DEFAULT_TRADE_PAGE_SIZE,
+                                    after_id=after_id, trade_id=trade_id, date_from=date_from,
+                                    date_to=date_to, issuer_id=issuer_id, trans_type_id=trans_type_id,
+                                    fields=fields, shape=shape.value)
         logging.info(f"Successfully retrieve trade list")
-        return result
+        # trades change outside this service, clients always revalidate and get 304 when unchanged
+        return conditional_json_response(request, result, "no-cache")
 
     except Exception as e:
         logging.error(f"Failed to retrieve list trades {e}")
         return {"status": "error", "message": f"Failed to retrieve list all trades"}
 
 
+# Trade counts and amount sums per issuer, transaction type, posting date or direction, from precomputed summaries
+@app.get("/trade_aggregates")
+async def trade_aggregates(request: Request, group_by: AggregateDimensionEnum = AggregateDimensionEnum.issuer_id):
+    try:
+        if not data_retriever.trade_aggregates_fresh():
+            # rebuilt in the background, the previous summaries keep being served (marked stale) meanwhile
+            _start_trade_aggregates_rebuild()
+        # summaries are in memory, not worth an executor hop
+        result = data_retriever.get_trade_aggregates(group_by.value)
+        if result.get("error_code") == "BUILDING":
+            return FastJSONResponse(result, status_code=503,
+                                    headers={"Retry-After": str(TRADE_AGGREGATES_RETRY_AFTER)})
+        if result.get("error_code") == "BUILD_FAILED":
+            return FastJSONResponse(result, status_code=500)
+        logging.info(f"Successfully retrieve trade aggregates by {group_by.value}")
+        return conditional_json_response(request, result, "no-cache", memoize=True)
+
+    except Exception as e:
+        logging.error(f"Failed to retrieve trade aggregates {e}")
+        return {"status": "error", "message": "Failed to retrieve trade aggregates"}
+
+
 @app.get("/app_doc_uploads/{app_id}")
 async def app_doc_uploads(app_id: int):
     try:
-        result = data_retriever.app_doc_uploads_by_id(app_id)
+        result = await run_read(data_retriever.app_doc_uploads_by_id, app_id)
         logging.info(f"Successfully retrieve app doc uploads")
-        return result
+        return FastJSONResponse(result)
 
     except Exception as e:
         logging.error(f"faild to retrieve app doc uploads")
 
 
 @app.get("/lookup_client/{app_id}", status_code=200)
-async def lookup_client(app_id: int):
+async def lookup_client(app_id: int, fields: str = Query(None, description=FIELDS_DESCRIPTION)):
     try:
-        result = data_retriever.lookup_client_by_id(app_id)
+        result = await run_read(data_retriever.lookup_client_by_id, app_id,
+                                _parse_csv_param(fields) if fields else None)
+        if result.get("error_code") == "BAD_FIELDS":
+            return result
         if result.get("status") == "error":
             if result.get("error_code") == "DB_ERR":
                 return {"status": "error", "message": "Database Error: Client does not exist"}
@@ -468,9 +1143,11 @@ async def lookup_client(app_id: int):
 
 
 @app.get("/lookup_forms/", status_code=200)
-async def lookup_forms():
+async def lookup_forms(fields: str = Query(None, description=FIELDS_DESCRIPTION)):
     try:
-        result = data_retriever.lookup_forms()
+        result = await run_read(data_retriever.lookup_forms, _parse_csv_param(fields) if fields else None)
+        if result.get("error_code") == "BAD_FIELDS":
+            return result
 
         if result.get("status") == "error":
             if result.get("error_code") == "DB_ERR":
@@ -493,8 +1170,11 @@ async def lookup_forms():
 
 
 @app.get("/lookup_response/{app_id}", status_code=200)
-async def lookup_response(app_id: int):
-    result = data_retriever.lookup_response_by_id(app_id)
+async def lookup_response(app_id: int, fields: str = Query(None, description=FIELDS_DESCRIPTION)):
+    result = await run_read(data_retriever.lookup_response_by_id, app_id,
+                            _parse_csv_param(fields) if fields else None)
+    if result.get("error_code") == "BAD_FIELDS":
+        return result
 
     if result.get("status") == "error":
         if result.get("error_code") == "DB_ERR":
@@ -506,7 +1186,7 @@ async def lookup_response(app_id: int):
 
     if result.get("status") == "success":
         logging.info(f"Successfully retrieved response details for ID {app_id}")
-        return result
+        return FastJSONResponse(result)
 
     logging.error(f"Failed to lookup response with ID {app_id}")
     return {"status": "error", "message": f"Failed to lookup response with ID {app_id}. ID not found."}
@@ -515,7 +1195,7 @@ async def lookup_response(app_id: int):
 @app.get("/lookup_sponsor/{app_id}", status_code=200)
 async def lookup_sponsor(app_id: int):
     try:
-        result = data_retriever.lookup_sponsor_by_id(app_id)
+        result = await run_read(data_retriever.lookup_sponsor_by_id, app_id)
 
         if result.get("status") == "error":
             if result.get("error_code") == "DB_ERR":
@@ -542,7 +1222,7 @@ async def lookup_sponsor(app_id: int):
 @app.get("/lookup_rep_join/{app_id}", status_code=200)
 async def lookup_rep_join(app_id: int):
     try:
-        result = data_retriever.lookup_rep_join_by_id(app_id)
+        result = await run_read(data_retriever.lookup_rep_join_by_id, app_id)
         if result.get("status") == "error":
             if result.get("error_code") == "DB_ERR":
                 return {"status": "error", "message": "Database Error: Rep Join does not exist"}
@@ -565,7 +1245,207 @@ async def lookup_rep_join(app_id: int):
                 "message": f"Unexpected error while looking up rep join: {e}"}
 
 
+def _parse_csv_param(value: str) -> List[str]:
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+async def _fetch_application_sections(app_ids: List[int], sections: List[str]) -> Dict[int, dict]:
+    """Run the (app_id, section) lookups concurrently on the DB executor, DB_REQUEST_FANOUT at a time, and group them
+    per app_id."""
+    calls = [(app_id, section) for app_id in app_ids for section in sections]
+    results = await db_executor.gather(
+        ((getattr(data_retriever, AppRulesDataRetriever.APPLICATION_SECTIONS[section]), app_id)
+         for app_id, section in calls), run=run_read)
+
+    bundles = {app_id: {} for app_id in app_ids}
+    for (app_id, section), result in zip(calls, results):
+        if isinstance(result, Exception):
+            logging.error(f"Failed to lookup {section} for application {app_id}: {result}")
+            result = {"status": "error", "message": f"Failed to lookup {section} for application {app_id}"}
+        bundles[app_id][section] = result
+    return bundles
+
+
+def _bundle_status(sections: Dict[str, dict]) -> str:
+    statuses = [section.get("status") for section in sections.values()]
+    if all(status == "success" for status in statuses):
+        return "success"
+    return "error" if all(status == "error" for status in statuses) else "partial"
+
+
+def _validate_sections(include: str):
+    sections = _parse_csv_param(include) if include else list(AppRulesDataRetriever.APPLICATION_SECTIONS)
+    unknown = [section for section in sections if section not in AppRulesDataRetriever.APPLICATION_SECTIONS]
+    return sections, unknown
+
+
+# All application screen lookups for one app_id in one request, sections run concurrently
+@app.get("/application/{app_id}/bundle")
+async def application_bundle(app_id: int, include: str = Query(
+        None, description="Comma separated sections: client,sponsor,response,rep_join,doc_uploads,rules")):
+    sections, unknown = _validate_sections(include)
+    if unknown:
+        return {"status": "error", "message": f"Unknown bundle sections: {', '.join(unknown)}"}
+
+    bundle = (await _fetch_application_sections([app_id], sections))[app_id]
+    logging.info(f"Retrieved bundle {sections} for application {app_id}")
+    return FastJSONResponse({"status": _bundle_status(bundle), "app_id": app_id, "data": bundle})
+
+
+# Multi app_id variant of /application/{app_id}/bundle for list screens
+@app.get("/applications/bundle")
+async def applications_bundle(app_ids: str = Query(..., description="Comma separated application ids"),
+                              include: str = None):
+    sections, unknown = _validate_sections(include)
+    if unknown:
+        return {"status": "error", "message": f"Unknown bundle sections: {', '.join(unknown)}"}
+    try:
+        ids = list(dict.fromkeys(int(app_id) for app_id in _parse_csv_param(app_ids)))
+    except ValueError:
+        return {"status": "error", "message": "app_ids must be a comma separated list of integers"}
+    if not ids or len(ids) > MAX_BUNDLE_APP_IDS:
+        return {"status": "error", "message": f"Provide between 1 and {MAX_BUNDLE_APP_IDS} app_ids"}
+
+    bundles = await _fetch_application_sections(ids, sections)
+    logging.info(f"Retrieved bundle {sections} for {len(ids)} applications")
+    return FastJSONResponse({"status": "success",
+                             "data": [{"app_id": app_id, "status": _bundle_status(bundle), "sections": bundle}
+                                      for app_id, bundle in bundles.items()]})
+
+
+async def _rule_change_events(subscription, snapshots: List[tuple]):
+    try:
+        for app_id, result in snapshots:
+            if isinstance(result, Exception) or result.get("status") != "success":
+                logging.error(f"Failed to lookup rules for application {app_id}: {result}")
+                yield RuleChangeFeed.encode("snapshot", {"app_id": app_id, "status": "error",
+                                                         "message": f"Failed to lookup rules for application {app_id}"})
+                continue
+            yield RuleChangeFeed.encode("snapshot", {"app_id": app_id, "status": "success",
+                                                     "rules": (result.get("data") or {}).get("app_rules_list") or []})
+        while True:
+            try:
+                yield await asyncio.wait_for(subscription.get(), APP_RULES_FEED_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                # keeps proxies from closing an idle stream
+                yield b": keep-alive\n\n"
+    finally:
+        data_retriever.rule_changes.unsubscribe(subscription)
+
+
+# Server-Sent Events: a snapshot of each application's rules, then the rules that change, instead of polling
+@app.get("/app_rules/changes")
+async def app_rules_changes(app_ids: str = Query(..., description="Comma separated application ids")):
+    try:
+        ids = list(dict.fromkeys(int(app_id) for app_id in _parse_csv_param(app_ids)))
+    except ValueError:
+        return {"status": "error", "message": "app_ids must be a comma separated list of integers"}
+    if not ids or len(ids) > MAX_FEED_APP_IDS:
+        return {"status": "error", "message": f"Provide between 1 and {MAX_FEED_APP_IDS} app_ids"}
+
+    # subscribed before the snapshot is read so no change falls in between, the snapshot is also the diff baseline
+    subscription = data_retriever.rule_changes.subscribe(ids)
+    try:
+        snapshots = await db_executor.gather((data_retriever.poll_app_rules, app_id) for app_id in ids)
+    except BaseException:
+        data_retriever.rule_changes.unsubscribe(subscription)
+        raise
+    logging.info(f"Subscribed to rule changes of {len(ids)} applications")
+    return StreamingResponse(_rule_change_events(subscription, list(zip(ids, snapshots))),
+                             media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+# Stream a full SP result set, rows are read from a server-side cursor and written as they arrive
+@app.get("/export/{dataset}")
+async def export_dataset(dataset: ExportDatasetEnum, format: ExportFormatEnum = ExportFormatEnum.ndjson,
+                         app_id: int = None, batch_size: int = Query(1000, ge=1, le=50000)):
+    sp, needs_app_id = EXPORT_DATASETS[dataset.value]
+    if needs_app_id and app_id is None:
+        return {"status": "error", "message": f"app_id is required to export {dataset.value}"}
+
+    # One DB executor slot is held for the whole stream, so running exports count against DB_MAX_CONCURRENCY. The
+    # connection is checked out and the CALL sent before answering, DB errors get a status code instead of a
+    # truncated 200 body.
+    await db_executor.acquire()
+    try:
+        result = await db_executor.submit(data_retriever.open_export, sp, params=[app_id] if needs_app_id else None,
+                                          batch_size=batch_size)
+    except BaseException:
+        db_executor.release()
+        raise
+    if result["status"] != "success":
+        db_executor.release()
+        if result.get("error_code") in ("DB_UNAVAILABLE", "POOL_TIMEOUT"):
+            retry_after = max(1, math.ceil(result.get("retry_after") or SHED_RETRY_AFTER))
+            return FastJSONResponse(result, status_code=503, headers={"Retry-After": str(retry_after)})
+        if result.get("error_code"):
+            return FastJSONResponse(result, status_code=500)
+        return result
+
+    if format == ExportFormatEnum.csv:
+        chunks, media_type = csv_lines(result["columns"], result["batches"]), "text/csv"
+    else:
+        chunks, media_type = ndjson_lines(result["columns"], result["batches"]), "application/x-ndjson"
+    stream = ExportStream(db_executor, result["batches"], chunks)
+
+    logging.info(f"Streaming export of {dataset.value} as {format.value}")
+    # the background task releases the slot when the client disconnects before the body started
+    return StreamingResponse(stream.body(), media_type=media_type, background=BackgroundTask(stream.aclose),
+                             headers={"Content-Disposition": f'attachment; filename="{dataset.value}.{format.value}"'})
+
+
+# Prometheus scrape endpoint
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+# DB pool, executor and circuit breaker state, used to size DB_POOL_MAX_SIZE / DB_EXECUTOR_WORKERS
+@app.get("/pool_stats")
+async def pool_stats():
+    if not data_retriever.built:
+        return FastJSONResponse({"status": "starting", "data": {"executor": db_executor.stats()}}, status_code=503)
+    return {"status": "success", "data": {"pool": data_retriever.pool_stats(), "replicas": data_retriever.replica_stats(),
+                                          "executor": db_executor.stats(), "breaker": data_retriever.breaker_stats()}}
+
+
+# Reference-data cache hit/miss, single-flight collapse counters and the in-memory indexes / summaries
+@app.get("/cache_stats")
+async def cache_stats():
+    if not data_retriever.built:
+        return FastJSONResponse({"status": "starting", "data": None}, status_code=503)
+    return {"status": "success",
+            "data": {"cache": data_retriever.cache_stats(), "single_flight": single_flight.stats() if single_flight is not None else {},
+                     "required_docs": data_retriever.required_docs_stats(),
+                     "rule_changes": data_retriever.rule_changes_stats(),
+                     "trade_aggregates": data_retriever.trade_aggregates_stats()}}
+
+
+# Where this worker's cold start went, see STARTUP_PROFILE_IMPORTS for per-module import times
+@app.get("/startup_profile", include_in_schema=False)
+async def startup_profile_report():
+    return {"status": "success", "data": startup_profile.report()}
+
+
+# Liveness: the event loop is serving requests
+@app.get("/healthz", include_in_schema=False)
+async def healthz():
+    return {"status": "ok"}
+
+
+# Readiness: pools are filled and reference tables loaded, load balancers should only route here when 200
+@app.get("/readyz", include_in_schema=False)
+async def readyz():
+    if not readiness["ready"]:
+        return FastJSONResponse({"status": "starting", "data": readiness["warm_up"]}, status_code=503)
+    return {"status": "ready", "data": readiness["warm_up"]}
+
+
+startup_profile.mark("app_built")
+
 if __name__ == "__main__":
     import uvicorn
 
+    # single process for local runs, use serve.py for multiple workers
     uvicorn.run(app, host="localhost", port=8004)
@@ -0,0 +1,123 @@
+"""Production entry point: N worker processes serving main:app.
+
+When REFERENCE_SNAPSHOT_PATH is set, the launcher reads the reference tables once and publishes them as a JSON
+snapshot file there, in a directory only this user can access, that every worker seeds its cache from during startup
+instead of each worker querying them. Without it every worker loads them from the database. Workers fill their pools
+and load the reference tables before accepting traffic and report it on /readyz.
+
+With gunicorn installed the workers run under gunicorn's UvicornWorker, which restarts crashed workers and does a
+graceful rolling restart on SIGHUP (the snapshot is republished first). Without it, uvicorn's own multi-process
+supervisor is used.
+
+    python serve.py --workers 4 --port 8004
+
+`--write-openapi <path>` generates the OpenAPI schema and exits, run it at image build time and point
+OPENAPI_SCHEMA_PATH at the file so workers never generate it.
+"""
+import argparse
+import logging
+import os
+
+from dotenv import load_dotenv
+
+from dbutil_package.db_pool import ConnectionPool
+from dbutil_package.db_snapshot import ReferenceSnapshot
+
+try:
+    from gunicorn.app.base import BaseApplication
+except ImportError:  # gunicorn is optional, uvicorn --workers is used without it
+    BaseApplication = None
+
+def publish_reference_snapshot(snapshot: ReferenceSnapshot):
+    """Read the reference tables on a short-lived pool and publish them. The pool is closed before workers fork."""
+    from dbutil_package.db_trades import AppRulesDataRetriever
+
+    if snapshot is None:
+        return
+    pool = ConnectionPool.from_env()
+    try:
+        tables = AppRulesDataRetriever.fetch_reference_tables(pool)
+        snapshot.publish(tables)
+    except Exception as e:
+        # Workers fall back to querying the reference tables themselves
+        logging.error(f"Could not publish the reference snapshot, workers will load from the database: {e}")
+        return
+    finally:
+        pool.close()
+    logging.info(f"Published {len(tables)} reference tables to {snapshot.path}")
+
+
+def write_openapi(path: str):
+    # importing main has no side effects, the retriever and logging are only set up by its startup hooks
+    import main
+
+    main.write_openapi_schema(path, main.custom_openapi())
+    logging.info(f"Wrote the OpenAPI schema to {path}")
+
+
+def run_gunicorn(args, snapshot: ReferenceSnapshot):
+    options = {
+        "bind": f"{args.host}:{args.port}",
+        "workers": args.workers,
+        "worker_class": "uvicorn.workers.UvicornWorker",
+        "graceful_timeout": args.graceful_timeout,
+        "timeout": args.timeout,
+        "max_requests": args.max_requests,
+        "max_requests_jitter": args.max_requests // 10,
+        "on_starting": lambda server: publish_reference_snapshot(snapshot),
+        "on_reload": lambda server: publish_reference_snapshot(snapshot),
+    }
+
+    class TradesApplication(BaseApplication):
+        def load_config(self):
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            from main import app
+            return app
+
+    TradesApplication().run()
+
+
+def run_uvicorn(args, snapshot: ReferenceSnapshot):
+    import uvicorn
+
+    publish_reference_snapshot(snapshot)
+    uvicorn.run("main:app", host=args.host, port=args.port, workers=args.workers,
+                limit_max_requests=args.max_requests or None)
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8004")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", str(os.cpu_count() or 1))))
+    parser.add_argument("--graceful-timeout", type=int, default=int(os.getenv("GRACEFUL_TIMEOUT", "30")),
+                        help="seconds a worker gets to finish in-flight requests on restart")
+    parser.add_argument("--timeout", type=int, default=int(os.getenv("WORKER_TIMEOUT", "120")),
+                        help="gunicorn only: restart a worker silent for this long")
+    parser.add_argument("--max-requests", type=int, default=int(os.getenv("WORKER_MAX_REQUESTS", "0")),
+                        help="recycle a worker after this many requests (0 = never)")
+    parser.add_argument("--write-openapi", metavar="PATH", help="write the OpenAPI schema to PATH and exit")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.write_openapi:
+        write_openapi(args.write_openapi)
+        return
+
+    # Workers inherit the environment, so main.py finds the snapshot through it
+    snapshot = ReferenceSnapshot.from_env()
+    if snapshot is None:
+        logging.warning("REFERENCE_SNAPSHOT_PATH is not set, every worker loads the reference tables from the database")
+
+    if BaseApplication is not None:
+        run_gunicorn(args, snapshot)
+    else:
+        run_uvicorn(args, snapshot)
+
+
+if __name__ == "__main__":
+    main()